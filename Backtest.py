@@ -1,11 +1,20 @@
 import os
 import logging
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
 import backtrader as bt
-from backtrader.analyzers import SharpeRatio, DrawDown, TimeReturn, TradeAnalyzer
 from dotenv import load_dotenv
 from strats.GoatStrat import GoatStrat
+from strats.GoatFast import run_fast
+from utils.Risk import RISK_PERCENTAGE, ACCOUNT_SIZE, RiskBudget
+from utils.Clients import offline
+from utils.ResultCache import ResultCache, result_key
+from utils.MonteCarlo import monte_carlo, log_monte_carlo, trade_pnls
+from utils.Metrics import EquityRecorder, RunningMetrics, compute_metrics, fast_metrics, write_report
+from utils.Intrabar import IntrabarBroker, intrabar_index, intrabar_interval
+from utils.CandleDB import interval_step
+from utils.GapScanner import repair_gaps
+from utils.DataFeed import BinanceStreamData, BinanceData as DataFeedBinanceData
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,85 +32,318 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Initialize SQL database
-db_uri = os.getenv('DB_URI_CANDLES')
-engine = create_engine(db_uri)
+# Stream candles through a server-side cursor instead of loading the range into a DataFrame
+stream_feed = os.getenv('STREAM_FEED') == 'True'
 
-class BinanceData(bt.feeds.PandasData):
+# Comma separated symbols run together as one portfolio instead of SYMBOL alone
+portfolio_symbols = [s for s in os.getenv('SYMBOLS', '').split(',') if s]
+
+# Backtest engine: 'backtrader', 'fast' (compiled NumPy loop) or 'parity' (both, compared)
+backtest_engine = os.getenv('BACKTEST_ENGINE', 'backtrader')
+
+# Reuse the stored result of an identical backtest (same candles, params, settings and code)
+use_result_cache = os.getenv('RESULT_CACHE') == 'True'
+
+# Resample the closed trades into Monte Carlo equity paths after the backtest
+run_monte_carlo = os.getenv('MONTE_CARLO') == 'True'
+
+# Write the metrics as JSON, or HTML when the path ends in .html
+metrics_report = os.getenv('METRICS_REPORT')
+
+# GoatStrat params that don't change a backtest's outcome, left out of the result key
+ignored_params = (
+    'binance_api_key', 'binance_api_secret', 'binance_testnet_key', 'binance_testnet_secret',
+    'use_testnet', 'api_url', 'client', 'symbol', 'risk_budget',
+)
+
+# Broker settings shared by both engines
+initial_cash = 1000
+commission = 0.001
+
+class FillRecorder(bt.Analyzer):
+    """Record (bar, size, price, commission) for every executed order."""
+
+    def start(self):
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills.append((len(order.data) - 1, order.executed.size, order.executed.price, order.executed.comm))
+
+    def get_analysis(self):
+        return self.fills
+
+class TradeRecorder(bt.Analyzer):
+    """Record the net P&L of every closed trade."""
+
+    def start(self):
+        self.pnls = []
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.pnls.append(trade.pnlcomm)
+
+    def get_analysis(self):
+        return self.pnls
+
+class OrderPruner(bt.Analyzer):
+    """Drop finished orders from the broker's and the strategy's bookkeeping after every bar.
+
+    backtrader keeps every order of the run, with a bracket queue and an OCO entry each, which would grow a
+    streamed run with each fill.
+    """
+
+    def next(self):
+        broker = self.strategy.broker
+        alive = []
+        for order in broker.orders:
+            if order.alive():
+                alive.append(order)
+                continue
+            # Executed single orders leave an empty bracket queue behind
+            if not broker._pchildren.get(order.ref, True):
+                del broker._pchildren[order.ref]
+            # An OCO entry is only looked up while its group is still open
+            if broker._ocos.get(order.ref) not in broker._ocol:
+                broker._ocos.pop(order.ref, None)
+        broker.orders = alive
+        self.strategy._orders = []
+
+class BinanceData(DataFeedBinanceData):
     """Custom Data Feed for Binance data."""
-    lines = ('open', 'high', 'low', 'close', 'volume')
-
-    params = (
-        ('nocase', True),
-        ('datetime', 3),
-        ('open', 4),
-        ('high', 5),
-        ('low', 6),
-        ('close', 7),
-        ('volume', 8),
-        ('openinterest', -1)
-    )
 
     @classmethod
-    def from_database(cls, symbol, interval, start_date, end_date, limit=10000):
-        """Fetch Binance data from the database and return a DataFrame."""
-        sql = text(f"SELECT * FROM {symbol}_{interval}_candles WHERE timestamp >= '{start_date}' AND timestamp <= '{end_date}' ORDER BY timestamp DESC LIMIT {limit}")
-        with engine.connect() as connection:
-            df = pd.read_sql_query(sql, connection)
-
-        # Convert columns with Timestamp objects to float values
-        df['open'] = pd.to_numeric(df['open_price'])
-        df['high'] = pd.to_numeric(df['high_price'])
-        df['low'] = pd.to_numeric(df['low_price'])
-        df['close'] = pd.to_numeric(df['close_price'])
-        df['volume'] = pd.to_numeric(df['volume'])
-
+    def from_database(cls, symbol, interval, start_date, end_date):
+        """Fetch Binance data from the database and return a data feed."""
+        df = super(BinanceData, cls).from_database(symbol, interval, start_date, end_date)
         return cls(dataname=df)
 
-def run_backtest(symbol, interval, start_date, end_date):
-    """Run the backtest and return the results."""
+def intrabar_broker(feeds, interval):
+    """Return an IntrabarBroker filling the stop and limit orders of each (symbol, data, arrays) feed on its INTRABAR_INTERVAL candles.
+
+    The finer candles of the whole range are loaded once per symbol, each bar then only slices them.
+    """
+    indexes = {}
+    for symbol, data, arrays in feeds:
+        if len(arrays.timestamp) == 0:
+            continue
+        start = pd.Timestamp(int(arrays.timestamp[0]), unit='ms')
+        end = pd.Timestamp(int(arrays.timestamp[-1]) + interval_step(interval) - 1, unit='ms')
+        indexes[data] = intrabar_index(arrays, interval, BinanceData.load_arrays(symbol, intrabar_interval, start, end))
+    return IntrabarBroker(indexes)
+
+def goat_params():
+    """Return GoatStrat's parameters as a dict."""
+    return dict(GoatStrat.params._getpairs())
+
+def run_backtest(symbol, interval, start_date, end_date, arrays=None, params=None, intrabar=True):
+    """Run the backtest and return the results, overriding GoatStrat's env params with `params` if given.
+
+    With `intrabar` False the stop and limit orders fill on the bars themselves even when INTRABAR_INTERVAL is set.
+    """
+    intrabar = intrabar and bool(intrabar_interval)
+    # Intrabar fills need the bar timestamps, so the range is loaded as arrays
+    if intrabar and symbol and arrays is None and not stream_feed:
+        arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+
     # Data Feeds
-    data = BinanceData.from_database(symbol, interval, start_date, end_date)
+    if arrays is not None:
+        data = BinanceData(dataname=arrays.to_frame())
+    elif stream_feed:
+        data = BinanceStreamData(symbol=symbol, interval=interval, start_date=start_date, end_date=end_date)
+    else:
+        data = BinanceData.from_database(symbol, interval, start_date, end_date)
     logger.info(f"Created data feed object for {symbol} {interval} data from {start_date} to {end_date}")
 
     # Cerebro
     cerebro = bt.Cerebro()
-    cerebro.addstrategy(GoatStrat)
+    if intrabar and arrays is not None and symbol:
+        # Stop loss and profit target orders are what the finer candles resolve
+        cerebro.broker = intrabar_broker([(symbol, data, arrays)], interval)
+        params = {'protective_exits': True, **(params or {})}
+    cerebro.addstrategy(GoatStrat, **(params or {}))
 
     # Add data to Cerebro
     cerebro.adddata(data)
 
     # Set the cash balance for the backtest
-    cerebro.broker.setcash(1000)
+    cerebro.broker.setcash(initial_cash)
 
     # Set the commission scheme
-    cerebro.broker.setcommission(commission=0.001)
+    cerebro.broker.setcommission(commission=commission)
+
+    if arrays is None and stream_feed:
+        # Streamed runs aggregate the metrics bar by bar, recording the equity curve and fills would grow with the run
+        cerebro.addanalyzer(RunningMetrics, initial_cash=initial_cash)
+        cerebro.addanalyzer(OrderPruner)
+    else:
+        # Add analyzers to Cerebro, they only record and the metrics are computed after the run
+        cerebro.addanalyzer(EquityRecorder)
+        cerebro.addanalyzer(FillRecorder)
+        cerebro.addanalyzer(TradeRecorder)
+
+    # Run the backtest and return the results, keeping only the bars indicators still need when streaming
+    return cerebro.run(exactbars=1 if stream_feed else False)
+
+def run_portfolio_backtest(symbols, interval, start_date, end_date, arrays=None, params=None):
+    """Run one GoatStrat per symbol in a single Cerebro, sharing the broker cash and a RiskBudget.
 
-    # Add analyzers to Cerebro
-    cerebro.addanalyzer(SharpeRatio)
-    cerebro.addanalyzer(DrawDown)
-    cerebro.addanalyzer(TimeReturn)
-    cerebro.addanalyzer(TradeAnalyzer)
+    Every symbol is loaded by one bulk query unless `arrays` ({symbol: CandleArrays}) is given.
+    """
+    if arrays is None:
+        arrays = BinanceData.load_many(symbols, interval, start_date, end_date)
 
-    # Run the backtest and return the results
+    cerebro = bt.Cerebro()
+    risk_budget = RiskBudget()
+    if intrabar_interval:
+        params = {'protective_exits': True, **(params or {})}
+    for symbol in symbols:
+        if len(arrays[symbol].timestamp) == 0:
+            logger.warning(f"No {symbol} {interval} candles between {start_date} and {end_date}, leaving it out")
+            continue
+        cerebro.adddata(BinanceData(dataname=arrays[symbol].to_frame()), name=symbol)
+        cerebro.addstrategy(GoatStrat, symbol=symbol, risk_budget=risk_budget, **(params or {}))
+    logger.info(f"Created portfolio of {len(cerebro.datas)} {interval} feeds from {start_date} to {end_date}")
+
+    if intrabar_interval:
+        cerebro.broker = intrabar_broker([(data._name, data, arrays[data._name]) for data in cerebro.datas], interval)
+
+    cerebro.broker.setcash(initial_cash)
+    cerebro.broker.setcommission(commission=commission)
+    cerebro.addanalyzer(EquityRecorder)
+    cerebro.addanalyzer(FillRecorder)
+    cerebro.addanalyzer(TradeRecorder)
     return cerebro.run()
 
-def analyze_results(results):
+def analyze_portfolio(results):
+    """Log the portfolio-wide results and the trades of each symbol, and return the portfolio metrics."""
+    # The recorded value is the shared broker's, so any strategy's equity is the whole portfolio's
+    recording = results[0].analyzers.equityrecorder.get_analysis()
+    fills = [fill for strategy in results for fill in strategy.analyzers.fillrecorder.get_analysis()]
+    trades = [pnl for strategy in results for pnl in strategy.analyzers.traderecorder.get_analysis()]
+    # Exposed on the bars where any symbol holds a position
+    position = np.column_stack([strategy.analyzers.equityrecorder.get_analysis().position for strategy in results]).any(axis=1)
+    metrics = compute_metrics(recording.timestamp, recording.equity, position, fills, trades, initial_cash)
+    logger.info(f"Portfolio Sharpe Ratio: {metrics['sharpe']}")
+    logger.info(f"Portfolio Max Drawdown: {metrics['max_drawdown']:.2%}")
+    logger.info(f"Portfolio Total Return: {metrics['total_return']:.2%}")
+    for strategy in results:
+        logger.info(f"{strategy.feed._name} Total Trades: {len(strategy.analyzers.traderecorder.get_analysis())}")
+    return metrics
+
+def run_fast_backtest(arrays, params=None):
+    """Run GoatStrat on the compiled engine and return a FastResult."""
+    result = run_fast(arrays, {**goat_params(), **(params or {})}, cash=initial_cash, commission=commission,
+                      risk_percentage=RISK_PERCENTAGE, account_size=ACCOUNT_SIZE)
+    logger.info(f"Fast backtest: {len(arrays.timestamp)} bars, {len(result.fills.bar)} fills, "
+                f"{len(result.trades.pnl)} trades, final value {result.final_value:.2f}")
+    return result
+
+def check_parity(symbol, interval, start_date, end_date, arrays=None, tolerance=1e-6):
+    """Run both engines on the same candles and return how far their fills and equity curves differ."""
+    if arrays is None:
+        arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+    # The fast engine fills on bars only, so the backtrader side must not use the finer candles either
+    if intrabar_interval:
+        logger.warning("Parity compares bar fills, INTRABAR_INTERVAL is ignored")
+    results = run_backtest(symbol, interval, start_date, end_date, arrays=arrays, intrabar=False)
+    fast = run_fast_backtest(arrays)
+
+    equity = results[0].analyzers.equityrecorder.get_analysis().equity
+    fills = np.array(results[0].analyzers.fillrecorder.get_analysis(), dtype=np.float64).reshape(-1, 4)
+    fast_fills = np.column_stack(fast.fills)
+
+    count = min(len(fills), len(fast_fills))
+    mismatched = np.flatnonzero(fills[:count, 0] != fast_fills[:count, 0])
+    diff = {
+        'fills': len(fills),
+        'fast_fills': len(fast_fills),
+        'first_bar_mismatch': int(fills[mismatched[0], 0]) if len(mismatched) else None,
+        'max_size_diff': float(np.abs(fills[:count, 1] - fast_fills[:count, 1]).max(initial=0.0)),
+        'max_price_diff': float(np.abs(fills[:count, 2] - fast_fills[:count, 2]).max(initial=0.0)),
+        'max_equity_diff': float(np.abs(equity - fast.equity[-len(equity):]).max(initial=0.0)),
+    }
+    diff['match'] = (
+        diff['fills'] == diff['fast_fills'] and diff['first_bar_mismatch'] is None
+        and max(diff['max_size_diff'], diff['max_price_diff'], diff['max_equity_diff']) <= tolerance
+    )
+
+    if diff['match']:
+        logger.info(f"Engines agree on {symbol} {interval}: {diff}")
+    else:
+        logger.warning(f"Engines diverge on {symbol} {interval}: {diff}")
+    return diff
+
+def summarize_results(results):
+    """Collect the metrics, fills, trades and equity curve of a run as plain data that can be cached.
+
+    Streamed runs only have their aggregated metrics, the fills, trades and curves are None.
+    """
+    strategy = results[0]
+    if 'runningmetrics' in strategy.analyzers.getnames():
+        return {
+            'metrics': strategy.analyzers.runningmetrics.get_analysis(),
+            'fills': None,
+            'trades': None,
+            'timestamp': None,
+            'equity': None,
+            'position': None,
+            'final_value': strategy.broker.getvalue(),
+        }
+    recording = strategy.analyzers.equityrecorder.get_analysis()
+    fills = strategy.analyzers.fillrecorder.get_analysis()
+    trades = strategy.analyzers.traderecorder.get_analysis()
+    return {
+        'metrics': compute_metrics(recording.timestamp, recording.equity, recording.position, fills, trades, initial_cash),
+        'fills': fills,
+        'trades': trades,
+        'timestamp': recording.timestamp,
+        'equity': recording.equity,
+        'position': recording.position,
+        'final_value': strategy.broker.getvalue(),
+    }
+
+def cached_backtest(symbol, interval, start_date, end_date, engine=backtest_engine, arrays=None):
+    """Return the stored result of an identical backtest, or run it and store the result.
+
+    The result is a summarize_results dict for backtrader and a FastResult for the fast engine.
+    """
+    if arrays is None:
+        arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+    params = {key: value for key, value in goat_params().items() if key not in ignored_params}
+    key = result_key(f"{symbol}_{interval}_candles", arrays, params, engine=engine, cash=initial_cash,
+                     commission=commission, risk_percentage=RISK_PERCENTAGE, account_size=ACCOUNT_SIZE,
+                     intrabar=intrabar_interval if engine != 'fast' else None)
+
+    cache = ResultCache()
+    result = cache.get(key)
+    if result is not None:
+        logger.info(f"Using cached {engine} result {key[:12]} for {symbol} {interval}")
+        return result
+
+    if engine == 'fast':
+        result = run_fast_backtest(arrays)
+    else:
+        result = summarize_results(run_backtest(symbol, interval, start_date, end_date, arrays=arrays))
+    cache.put(key, result)
+    return result
+
+def analyze_results(metrics):
     """Analyze the results and log the output."""
-    # Get the analyzers from the results
-    sharpe_ratio = results[0].analyzers.sharperatio.get_analysis()
-    drawdown = results[0].analyzers.drawdown.get_analysis()
-    time_return = results[0].analyzers.timereturn.get_analysis()
-    trade_analyzer = results[0].analyzers.tradeanalyzer.get_analysis()
+    trades = metrics['trades']
 
     # Log the results
-    logger.info(f"Sharpe Ratio: {sharpe_ratio['sharperatio']:.2f}")
-    logger.info(f"Max Drawdown: {drawdown['max']['drawdown']:.2%}")
-    logger.info(f"Total Return: {time_return['timereturn']:.2%}")
-    logger.info(f"Total Trades: {trade_analyzer['total']['total']}")
-    logger.info(f"Total Wins: {trade_analyzer['won']['total']}")
-    logger.info(f"Total Losses: {trade_analyzer['lost']['total']}")
-    logger.info(f"Win Rate: {trade_analyzer['won']['total'] / trade_analyzer['total']['total']:.2%}")
+    logger.info(f"Sharpe Ratio: {metrics['sharpe']}")
+    logger.info(f"Sortino Ratio: {metrics['sortino']}")
+    logger.info(f"Max Drawdown: {metrics['max_drawdown']:.2%} over {metrics['max_drawdown_days']:.1f} days")
+    logger.info(f"Total Return: {metrics['total_return']:.2%}")
+    logger.info(f"Exposure: {metrics['exposure']:.2%}")
+    logger.info(f"Turnover: {metrics['turnover']:.2f}")
+    logger.info(f"Total Trades: {trades['total']}")
+    logger.info(f"Total Wins: {trades['won']}")
+    logger.info(f"Total Losses: {trades['lost']}")
+    if trades['total']:
+        logger.info(f"Win Rate: {trades['win_rate']:.2%}")
 
 if __name__ == '__main__':
     try:
@@ -110,14 +352,49 @@ if __name__ == '__main__':
         start_date = pd.to_datetime(os.getenv('START_DATE'))
         end_date = pd.to_datetime(os.getenv('END_DATE'))
 
-        # Run the backtest
-        results = run_backtest(symbol, interval, start_date, end_date)
+        # Fill holes in the candle table before loading it
+        if os.getenv('REPAIR_GAPS') == 'True' and not offline:
+            for job_symbol in portfolio_symbols or [symbol]:
+                repair_gaps(job_symbol, interval)
+
+        if portfolio_symbols:
+            metrics = analyze_portfolio(run_portfolio_backtest(portfolio_symbols, interval, start_date, end_date))
+            if metrics_report:
+                write_report(metrics, metrics_report, title=f"{', '.join(portfolio_symbols)} {interval}")
+        elif backtest_engine == 'fast':
+            if intrabar_interval:
+                logger.warning("The fast engine fills on bars only, INTRABAR_INTERVAL is ignored")
+            arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+            if use_result_cache:
+                result = cached_backtest(symbol, interval, start_date, end_date, engine='fast', arrays=arrays)
+            else:
+                result = run_fast_backtest(arrays)
+            metrics = fast_metrics(arrays.timestamp, result, initial_cash)
+            analyze_results(metrics)
+            if metrics_report:
+                write_report(metrics, metrics_report, equity=result.equity, title=f"{symbol} {interval}")
+            if run_monte_carlo:
+                log_monte_carlo(monte_carlo(trade_pnls(result), initial_cash))
+        elif backtest_engine == 'parity':
+            check_parity(symbol, interval, start_date, end_date)
+        else:
+            # Run the backtest, or reuse the result of an identical run
+            if use_result_cache:
+                summary = cached_backtest(symbol, interval, start_date, end_date)
+            else:
+                summary = summarize_results(run_backtest(symbol, interval, start_date, end_date))
 
-        # Analyze and log the results
-        analyze_results(results)
+            # Analyze and log the results
+            analyze_results(summary['metrics'])
+            if metrics_report:
+                write_report(summary['metrics'], metrics_report, equity=summary['equity'], title=f"{symbol} {interval}")
+            if run_monte_carlo and summary['trades'] is None:
+                logger.warning("Streamed runs don't keep the trades, MONTE_CARLO is skipped")
+            elif run_monte_carlo:
+                log_monte_carlo(monte_carlo(trade_pnls(summary), initial_cash))
 
-        # Plot the results
-        bt.Cerebro().plot()
+            # Plot the results
+            bt.Cerebro().plot()
 
     except Exception as e:
         logger.error(f"Error running backtest: {e}", exc_info=True)
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import logging
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from utils.Clients import get_engine, set_engine
+from utils.CandleDB import candles_table, create_indexes, insert_data_to_db, interval_step
+from utils.CandleCache import CandleArrays
+from utils import DataFeed
+from utils.DataBase import metadata as trades_metadata, insert_trade
+from Backtest import run_backtest, run_fast_backtest
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs/Benchmark.log')
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Benchmark Setting
+bench_rows = int(os.getenv('BENCH_ROWS', 200_000))
+bench_backtest_rows = int(os.getenv('BENCH_BACKTEST_ROWS', 20_000))
+bench_trades = int(os.getenv('BENCH_TRADES', 5_000))
+bench_seed = int(os.getenv('BENCH_SEED', 42))
+bench_symbol = os.getenv('BENCH_SYMBOL', 'BENCHUSDT')
+bench_interval = os.getenv('BENCH_INTERVAL', '1m')
+bench_output = os.getenv('BENCH_OUTPUT')
+
+# Postgres URI to benchmark against, a throwaway SQLite file otherwise
+bench_db_uri = os.getenv('BENCH_DB_URI')
+
+def synthetic_klines(rows, interval=bench_interval, seed=bench_seed, start=1_577_836_800_000):
+    """Return `rows` Binance-style klines of a geometric random walk, the same series for the same seed."""
+    rng = np.random.default_rng(seed)
+    close = 10_000 * np.exp(np.cumsum(rng.normal(0, 0.002, rows)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.001, rows)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(3, 0.5, rows)
+    open_time = start + np.arange(rows, dtype=np.int64) * interval_step(interval)
+    return [
+        [int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}"]
+        for t, o, h, l, c, v in zip(open_time.tolist(), open_.tolist(), high.tolist(), low.tolist(), close.tolist(), volume.tolist())
+    ]
+
+def synthetic_arrays(rows, interval=bench_interval, seed=bench_seed):
+    """Return the synthetic_klines series as CandleArrays."""
+    block = np.array([kline[:6] for kline in synthetic_klines(rows, interval, seed)], dtype=np.float64)
+    return CandleArrays(block[:, 0].astype(np.int64), np.ascontiguousarray(block[:, 1:]))
+
+def current_rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def prepare_database(engine, symbol=bench_symbol, interval=bench_interval):
+    """Create empty candles and trades tables on the benchmark database."""
+    table = candles_table(symbol, interval)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+        connection.execute(text("DROP TABLE IF EXISTS trades"))
+    table.create(engine)
+    trades_metadata.create_all(engine)
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            create_indexes(connection, symbol, interval)
+        else:
+            connection.execute(text(f"CREATE UNIQUE INDEX {table.name}_key ON {table.name} (symbol, interval, timestamp)"))
+
+def bench_ingest(rows, symbol=bench_symbol, interval=bench_interval):
+    """Time CandleDB.insert_data_to_db on `rows` synthetic klines."""
+    klines = synthetic_klines(rows, interval)
+    started = time.perf_counter()
+    written = insert_data_to_db(klines, symbol, interval)
+    elapsed = time.perf_counter() - started
+    return {'rows': written, 'seconds': elapsed, 'rows_per_s': written / elapsed}
+
+def _load_worker(queue, symbol, interval):
+    # Connections pooled by the parent must not be shared with the forked child
+    get_engine().dispose(close=False)
+    baseline = current_rss()
+    started = time.perf_counter()
+    df = DataFeed.BinanceData.from_database(symbol, interval, None, None)
+    elapsed = time.perf_counter() - started
+    queue.put((len(df), elapsed, peak_rss() - baseline))
+
+def bench_load(symbol=bench_symbol, interval=bench_interval):
+    """Time DataFeed.from_database in a forked process so its peak RSS is not hidden by earlier phases."""
+    queue = multiprocessing.get_context('fork').Queue()
+    process = multiprocessing.get_context('fork').Process(target=_load_worker, args=(queue, symbol, interval))
+    process.start()
+    rows, elapsed, peak = queue.get()
+    process.join()
+    return {
+        'rows': rows,
+        'ms': elapsed * 1000,
+        'peak_rss_mb': peak / 2**20,
+        'peak_rss_mb_per_million_rows': peak / 2**20 / max(rows, 1) * 1_000_000,
+    }
+
+def bench_backtest(rows, interval=bench_interval):
+    """Time a GoatStrat backtest on `rows` synthetic bars with backtrader and with the fast engine."""
+    arrays = synthetic_arrays(rows, interval)
+    started = time.perf_counter()
+    run_backtest(bench_symbol, interval, None, None, arrays=arrays)
+    backtrader_seconds = time.perf_counter() - started
+
+    # The first fast run pays for compilation when numba is installed
+    run_fast_backtest(arrays)
+    started = time.perf_counter()
+    run_fast_backtest(arrays)
+    fast_seconds = time.perf_counter() - started
+    return {
+        'bars': rows,
+        'backtrader_seconds': backtrader_seconds,
+        'backtrader_bars_per_s': rows / backtrader_seconds,
+        'fast_seconds': fast_seconds,
+        'fast_bars_per_s': rows / fast_seconds,
+    }
+
+def bench_insert_trade(engine, trades, symbol=bench_symbol):
+    """Time DataBase.insert_trade on `trades` synthetic fills."""
+    rng = np.random.default_rng(bench_seed)
+    fills = [{
+        'id': i + 1,
+        'price': f"{price:.2f}",
+        'qty': f"{qty:.6f}",
+        'time': 1_577_836_800_000 + i * 1000,
+        'buyer': bool(i % 2),
+        'commission': f"{price * qty * 0.0004:.8f}",
+    } for i, (price, qty) in enumerate(zip(rng.uniform(9_000, 11_000, trades).tolist(), rng.uniform(0.001, 1, trades).tolist()))]
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        for fill in fills:
+            insert_trade(conn, symbol, fill)
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    return {'trades': trades, 'seconds': elapsed, 'trades_per_s': trades / elapsed}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(rows=bench_rows, backtest_rows=bench_backtest_rows, trades=bench_trades, db_uri=bench_db_uri):
+    """Run every benchmark and return the results as a JSON-serializable dict."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(db_uri or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        set_engine(engine, 'DB_URI_CANDLES')
+        set_engine(engine, 'DB_URI_TRADE')
+        # Time the database path of from_database, not the local candle cache
+        DataFeed.use_cache = False
+        DataFeed.resample_from_base = False
+
+        prepare_database(engine)
+        results = {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'database': engine.dialect.name,
+            'seed': bench_seed,
+            'ingest': bench_ingest(rows),
+            'load': bench_load(),
+            'backtest': bench_backtest(min(backtest_rows, rows)),
+            'insert_trade': bench_insert_trade(engine, trades),
+        }
+        engine.dispose()
+    return results
+
+if __name__ == '__main__':
+    try:
+        results = run_benchmarks()
+        output = json.dumps(results, indent=2)
+        if bench_output:
+            with open(bench_output, 'w') as f:
+                f.write(output)
+        print(output)
+
+    except Exception as e:
+        logger.error(f"Error running benchmarks: {e}", exc_info=True)
+        raise e
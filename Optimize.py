@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import random
+import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from utils.CandleCache import CandleArrays, CANDLE_FIELDS
+from utils.Metrics import bar_returns, bars_per_year, drawdown_stats, sharpe_ratio
+from Backtest import BinanceData, backtest_engine, run_backtest, run_fast_backtest
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs/Optimize.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Search space as JSON: lists of values for a grid, [low, high] ranges for random sampling
+optimize_params = os.getenv('OPTIMIZE_PARAMS', '{"bb_length": [14, 20, 30], "mult": [1.5, 2.0, 2.5]}')
+optimize_mode = os.getenv('OPTIMIZE_MODE', 'grid')
+optimize_samples = int(os.getenv('OPTIMIZE_SAMPLES', 100))
+optimize_seed = os.getenv('OPTIMIZE_SEED')
+optimize_workers = int(os.getenv('OPTIMIZE_WORKERS', os.cpu_count() or 1))
+optimize_top = int(os.getenv('OPTIMIZE_TOP', 10))
+
+# Candle arrays attached to the shared memory block in each worker process
+_block = None
+_arrays = None
+
+def parameter_sets(space, mode=optimize_mode, samples=optimize_samples, seed=optimize_seed):
+    """Expand the search space into a list of GoatStrat param dicts.
+
+    In grid mode every combination of the listed values is returned. In random mode `samples` sets are
+    drawn uniformly from each [low, high] range, as integers when both bounds are integers.
+    """
+    names = list(space)
+    if mode == 'grid':
+        return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if mode != 'random':
+        raise ValueError(f"Unknown optimize mode: {mode}")
+
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(samples):
+        params = {}
+        for name in names:
+            low, high = space[name]
+            params[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+        sets.append(params)
+    return sets
+
+def share_arrays(arrays):
+    """Copy CandleArrays into one shared memory block so worker processes can map them without pickling."""
+    rows = len(arrays.timestamp)
+    block = shared_memory.SharedMemory(create=True, size=max(arrays.timestamp.nbytes + arrays.ohlcv.nbytes, 1))
+    np.ndarray((rows,), dtype=np.int64, buffer=block.buf)[:] = arrays.timestamp
+    np.ndarray((rows, len(CANDLE_FIELDS)), dtype=np.float64, buffer=block.buf, offset=rows * 8)[:] = arrays.ohlcv
+    return block
+
+def attach_arrays(name, rows):
+    """Map the CandleArrays of a shared memory block created by share_arrays."""
+    block = shared_memory.SharedMemory(name=name)
+    timestamp = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+    ohlcv = np.ndarray((rows, len(CANDLE_FIELDS)), dtype=np.float64, buffer=block.buf, offset=rows * 8)
+    return block, CandleArrays(timestamp, ohlcv)
+
+def _init_worker(name, rows):
+    global _block, _arrays
+    _block, _arrays = attach_arrays(name, rows)
+
+def equity_stats(equity, timestamp):
+    """Annualized Sharpe ratio of the bar returns and max drawdown in percent of an equity curve."""
+    if len(equity) < 2:
+        return None, 0.0
+    return sharpe_ratio(bar_returns(equity), bars_per_year(timestamp)), drawdown_stats(equity, timestamp)[0] * 100
+
+def shared_arrays(start=0, end=None):
+    """Return the bars [start, end) of the candle arrays shared with this worker process."""
+    return CandleArrays(_arrays.timestamp[start:end], _arrays.ohlcv[start:end])
+
+def backtest(arrays, params):
+    """Backtest one parameter set on the engine selected by BACKTEST_ENGINE.
+
+    Returns (sharpe, drawdown, final_value, equity) where equity is the broker value at every bar. Both
+    engines are scored by equity_stats, so their results rank the same way.
+    """
+    if backtest_engine == 'fast':
+        fast = run_fast_backtest(arrays, params)
+        sharpe, drawdown = equity_stats(fast.equity, arrays.timestamp)
+        return sharpe, drawdown, fast.final_value, fast.equity
+
+    strategy = run_backtest(None, None, None, None, arrays=arrays, params=params)[0]
+    equity = strategy.analyzers.equityrecorder.get_analysis().equity
+    sharpe, drawdown = equity_stats(equity, arrays.timestamp)
+    return sharpe, drawdown, strategy.broker.getvalue(), equity
+
+def evaluate(task):
+    """Backtest one (params, start, end) task on the shared candle rows [start, end) and return its scores."""
+    params, start, end = task
+    result = {'params': params, 'start': start, 'end': end, 'sharpe': None, 'drawdown': None, 'final_value': None}
+    try:
+        result['sharpe'], result['drawdown'], result['final_value'], _ = backtest(shared_arrays(start, end), params)
+    except Exception as e:
+        logger.error(f"Error evaluating {params} on bars {start}-{end}: {e}")
+    return result
+
+def rank(results):
+    """Sort results by Sharpe ratio, best first, breaking ties on the smaller drawdown."""
+    return sorted(results, key=lambda r: (
+        r['sharpe'] is None,
+        -(r['sharpe'] or 0.0),
+        r['drawdown'] if r['drawdown'] is not None else float('inf'),
+    ))
+
+def run_tasks(arrays, tasks, workers=optimize_workers, function=evaluate):
+    """Run `function` over (params, start, end) tasks in a process pool sharing one copy of the candle arrays."""
+    block = share_arrays(arrays)
+    try:
+        # Several tasks per message keep the pool busy without a round trip per backtest
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(block.name, len(arrays.timestamp))) as executor:
+            return list(executor.map(function, tasks, chunksize=chunksize))
+    finally:
+        block.close()
+        block.unlink()
+
+def optimize(arrays, space, mode=optimize_mode, samples=optimize_samples, workers=optimize_workers, seed=optimize_seed):
+    """Backtest every parameter set of the search space on `arrays` and return the ranked results."""
+    sets = parameter_sets(space, mode, samples, seed)
+    started = time.perf_counter()
+    results = rank(run_tasks(arrays, [(params, 0, len(arrays.timestamp)) for params in sets], workers))
+    logger.info(f"Evaluated {len(sets)} parameter sets on {len(arrays.timestamp)} bars with {workers} workers in {time.perf_counter() - started:.2f}s")
+    return results
+
+if __name__ == '__main__':
+    try:
+        symbol = os.getenv('SYMBOL')
+        interval = os.getenv('INTERVAL')
+        start_date = pd.to_datetime(os.getenv('START_DATE'))
+        end_date = pd.to_datetime(os.getenv('END_DATE'))
+
+        arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+        results = optimize(arrays, json.loads(optimize_params))
+
+        for position, result in enumerate(results[:optimize_top], 1):
+            logger.info(f"#{position} Sharpe: {result['sharpe']} Max Drawdown: {result['drawdown']} Final Value: {result['final_value']} Params: {result['params']}")
+
+    except Exception as e:
+        logger.error(f"Error running optimizer: {e}", exc_info=True)
+        raise e
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from Backtest import BinanceData, goat_params, initial_cash
+from Optimize import (
+    backtest, equity_stats, parameter_sets, rank, run_tasks, shared_arrays,
+    optimize_params, optimize_mode, optimize_samples, optimize_seed, optimize_workers,
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs/Optimize.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Window sizes in bars; each out-of-sample slice directly follows its in-sample slice
+in_sample_bars = int(os.getenv('WALK_FORWARD_IN_SAMPLE', 2000))
+out_sample_bars = int(os.getenv('WALK_FORWARD_OUT_SAMPLE', 500))
+
+# Anchored windows keep every in-sample slice starting at the first bar instead of rolling forward
+anchored = os.getenv('WALK_FORWARD_ANCHORED') == 'True'
+
+def walk_forward_windows(rows, in_sample=in_sample_bars, out_sample=out_sample_bars, anchored=anchored):
+    """Return (in_sample_start, out_sample_start, out_sample_end) bar indices, stepping by one out-of-sample slice."""
+    windows = []
+    start = 0
+    while start + in_sample + out_sample <= rows:
+        windows.append((0 if anchored else start, start + in_sample, start + in_sample + out_sample))
+        start += out_sample
+    return windows
+
+def warmup_bars(params):
+    """Bars GoatStrat's indicators need before they can signal."""
+    params = {**goat_params(), **params}
+    return max(params['bb_length'], params['rsi_period'] + 1, params['vol_period'])
+
+def evaluate_out_of_sample(task):
+    """Backtest the chosen params on an out-of-sample slice and return its scores and equity curve.
+
+    The slice is preceded by the indicator warm-up bars, during which the strategy stays flat, and the
+    scores are computed on the out-of-sample bars only.
+    """
+    params, start, end = task
+    warmup = min(warmup_bars(params), start)
+    arrays = shared_arrays(start - warmup, end)
+    result = {'params': params, 'start': start, 'end': end, 'sharpe': None, 'drawdown': None, 'final_value': None, 'equity': None}
+    try:
+        equity = np.asarray(backtest(arrays, params)[3])[warmup:]
+        result['sharpe'], result['drawdown'] = equity_stats(equity, arrays.timestamp[warmup:])
+        result['final_value'] = float(equity[-1])
+        result['equity'] = equity
+    except Exception as e:
+        logger.error(f"Error evaluating {params} out of sample on bars {start}-{end}: {e}")
+    return result
+
+def stitch_equity(arrays, results, cash=initial_cash):
+    """Chain the out-of-sample equity curves, each window starting from the capital the previous one ended with."""
+    timestamps, curves = [], []
+    capital = cash
+    for result in results:
+        if result['equity'] is None:
+            continue
+        curve = result['equity'] * (capital / cash)
+        timestamps.append(arrays.timestamp[result['start']:result['end']])
+        curves.append(curve)
+        capital = curve[-1]
+    if not curves:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(timestamps), np.concatenate(curves)
+
+def walk_forward(arrays, space, in_sample=in_sample_bars, out_sample=out_sample_bars, anchored=anchored,
+                 mode=optimize_mode, samples=optimize_samples, workers=optimize_workers, seed=optimize_seed):
+    """Optimize on each in-sample slice, score the winner on the following out-of-sample slice and stitch the results.
+
+    Every in-sample backtest of every window goes to one process pool, then every out-of-sample backtest to
+    another, both sharing the same candle arrays. Returns (windows, timestamp, equity) where windows holds
+    the best in-sample and the out-of-sample result of each window.
+    """
+    windows = walk_forward_windows(len(arrays.timestamp), in_sample, out_sample, anchored)
+    if not windows:
+        raise ValueError(f"{len(arrays.timestamp)} bars are not enough for a {in_sample} + {out_sample} bar window")
+
+    started = time.perf_counter()
+    sets = parameter_sets(space, mode, samples, seed)
+    tasks = [(params, is_start, oos_start) for is_start, oos_start, _ in windows for params in sets]
+    by_window = defaultdict(list)
+    for result in run_tasks(arrays, tasks, workers):
+        by_window[(result['start'], result['end'])].append(result)
+    best = [rank(by_window[(is_start, oos_start)])[0] for is_start, oos_start, _ in windows]
+
+    oos_tasks = [(result['params'], oos_start, oos_end) for result, (_, oos_start, oos_end) in zip(best, windows)]
+    out_of_sample = run_tasks(arrays, oos_tasks, workers, function=evaluate_out_of_sample)
+
+    timestamp, equity = stitch_equity(arrays, out_of_sample)
+    logger.info(f"Walk-forward over {len(windows)} windows of {len(sets)} parameter sets in {time.perf_counter() - started:.2f}s")
+    return list(zip(best, out_of_sample)), timestamp, equity
+
+if __name__ == '__main__':
+    try:
+        symbol = os.getenv('SYMBOL')
+        interval = os.getenv('INTERVAL')
+        start_date = pd.to_datetime(os.getenv('START_DATE'))
+        end_date = pd.to_datetime(os.getenv('END_DATE'))
+
+        arrays = BinanceData.load_arrays(symbol, interval, start_date, end_date)
+        windows, timestamp, equity = walk_forward(arrays, json.loads(optimize_params))
+
+        for in_sample, out_of_sample in windows:
+            logger.info(f"Window {pd.Timestamp(arrays.timestamp[out_of_sample['start']], unit='ms')}: Params: {in_sample['params']} "
+                        f"IS Sharpe: {in_sample['sharpe']} OOS Sharpe: {out_of_sample['sharpe']} OOS Max Drawdown: {out_of_sample['drawdown']}")
+
+        if len(equity):
+            sharpe, drawdown = equity_stats(equity, timestamp)
+            logger.info(f"Out-of-sample Sharpe: {sharpe} Max Drawdown: {drawdown:.2f}% Total Return: {equity[-1] / initial_cash - 1:.2%}")
+
+    except Exception as e:
+        logger.error(f"Error running walk-forward: {e}", exc_info=True)
+        raise e
@@ -6,16 +6,18 @@ import backtrader as bt
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from strats.GoatStrat import GoatStrat
-from utils.DataBase import insert_trade
+from utils.DataBase import insert_trade, setup_database
 from utils.CandleDB import insert_data_to_db
-from utils.DataFeed import BinanceData
+from utils.DataFeed import BinanceLiveData
 from utils.Risk import manage_trade, get_margin_percentage
 from utils.SafeAPI import safe_api_call
 from binance_f import RequestClient
 from binance_f.constant.test import *
 from binance_f.base.printobject import *
-from utils.Broker import BinanceBroker
-from utils.Risk import RiskManagement
+from utils.AsyncBroker import BatchingBroker
+from utils.Risk import RiskBudget
+from utils.ExchangeInfo import get_metadata
+from utils.AccountStream import get_mirror, start_mirror
 
 # Load environment variables
 load_dotenv()
@@ -35,6 +37,7 @@ logger = logging.getLogger(__name__)
 
 # Trading Settings
 symbol = os.getenv('SYMBOL')
+symbols = [s for s in os.getenv('SYMBOLS', '').split(',') if s] or [symbol]
 interval = os.getenv('INTERVAL')
 use_testnet = os.getenv('USE_TESTNET') == 'True'
 backtesting = os.getenv('BACKTESTING') == 'True'
@@ -44,6 +47,7 @@ api_key = os.getenv('BINANCE_API_KEY')
 api_secret = os.getenv('BINANCE_API_SECRET')
 api_testnet_key = os.getenv('BINANCE_TESTNET_KEY')
 data_pair = os.getenv('DATA_PAIR')
+user_stream = os.getenv('USER_STREAM', 'True') == 'True'  # Mirror the account from the user data stream instead of polling REST
 
 # Default start and end dates
 start_date = os.getenv('START_DATE')
@@ -58,16 +62,20 @@ else:
     #symbol += '_PERP'
 
 def get_balance(api_key, api_secret, use_testnet, symbol, margin_type):
-    broker = BinanceBroker(api_key=api_key, api_secret=api_secret, use_testnet=use_testnet, symbol=symbol, margin_type=margin_type)
-    balance = broker.get_balance_broker()
-    usdt_balance = float([asset['balance'] for asset in balance if asset['asset'] == 'USDT'][0])
+    # Read the streamed account mirror, or the shared metadata cache while it isn't in sync
+    mirror = get_mirror()
+    if mirror is not None and mirror.synced:
+        usdt_balance = mirror.balance('USDT')
+    else:
+        usdt_balance = get_metadata().balance('USDT')
     logger.info(f"Account balance: ${usdt_balance:.2f}")
     return usdt_balance
 
 # Set commissions and leverage
 def set_commissions_and_leverage(broker, margin_type, leverage):
-    maker_rate, taker_rate = 0, 0
-    broker.set_commission(maker_rate, taker_rate)
+    # Commission rates are set by the exchange, they are only read from the metadata cache
+    maker_rate, taker_rate = get_metadata().commission(broker.symbol)
+    logging.info(f"Commission rates for {broker.symbol}: maker {maker_rate}, taker {taker_rate}")
     logging.info(f"Setting margin type to {margin_type}")
     logging.info(f"Setting leverage to {leverage} for symbol {broker.symbol}")
     broker.set_leverage(leverage)
@@ -84,31 +92,42 @@ if __name__ == '__main__':
         api_url = 'https://fapi.binance.com'
         #symbol += '_PERP'
         
-    data = BinanceData.from_database(symbol, interval, start_date, end_date)
-    data = bt.feeds.PandasData(dataname=data)
-    logging.info(f"Created data feed object for {symbol} {interval} data for live trading")
+    # One live feed per symbol, all driven by the same Cerebro
+    datas = [BinanceLiveData(symbol=data_symbol, interval=interval, start_date=start_date) for data_symbol in symbols]
+    logging.info(f"Created live data feed objects for {', '.join(symbols)} {interval} data for live trading")
 
     # Create strategy object
     strategy = GoatStrat
     logging.info(f"Created strategy object: {strategy.__name__}")
 
-    # Create a broker object using the BinanceBroker class
-    broker = BinanceBroker(api_key=api_key, api_secret=api_secret, use_testnet=use_testnet, symbol=symbol, margin_type=margin_type)
-    set_commissions_and_leverage(broker, margin_type, leverage)
-    logging.info("Created broker object and set commissions and leverage")
+    # The stop loss and profit target orders would only fill in Cerebro's simulated broker
+    if GoatStrat.params.protective_exits:
+        raise SystemExit("PROTECTIVE_EXITS is for backtests only, live trading sends market orders only")
+
+    # Schema setup is lazy, create the trades table of a fresh database before anything records a trade
+    setup_database()
+
+    # Load symbol filters, commission rates and leverage brackets before the first order needs them
+    get_metadata().warm(symbols)
+
+    # Positions, balances and orders are kept in memory from the user data stream
+    if user_stream:
+        start_mirror()
 
-    # Instantiate the RiskManagement class
-    risk_management = RiskManagement(
-        max_drawdown=float(os.getenv("MAX_DRAWDOWN")),
-        max_consecutive_losses=int(os.getenv("MAX_CONSECUTIVE_LOSSES")),
-        max_leverage=int(os.getenv("MAX_LEVERAGE")),
-    )
+    # One batching broker per symbol, each bar's market orders go out in batchOrders requests over a pooled session
+    brokers = {data_symbol: BatchingBroker(api_key, api_secret, data_symbol) for data_symbol in symbols}
+    for broker in brokers.values():
+        set_commissions_and_leverage(broker, margin_type, leverage)
+    logging.info("Created broker objects and set commissions and leverage")
 
-    # Initialize strategy with broker, data feed, and risk management
+    # Initialize strategy with data feed and risk budget
     cerebro = bt.Cerebro()
-    cerebro.addstrategy(strategy, broker=broker, risk_management=risk_management)  # Pass the risk_management object
-    cerebro.adddata(data)
-    logging.info("Initialized strategy with broker, data feed, and risk management")
+    # Every symbol gets its own GoatStrat, sharing the broker cash and the portfolio risk budget
+    risk_budget = RiskBudget()
+    for data_symbol, data in zip(symbols, datas):
+        cerebro.addstrategy(strategy, symbol=data_symbol, risk_budget=risk_budget, live_broker=brokers[data_symbol])
+        cerebro.adddata(data, name=data_symbol)
+    logging.info("Initialized strategy with data feed and risk budget")
 
     # Add risk management function to strategy
     cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
@@ -116,11 +135,11 @@ if __name__ == '__main__':
     cerebro.addanalyzer(bt.analyzers.Transactions, _name='transactions')
     cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
 
-    # Start trading loop
+    # Start trading loop, the live feed keeps a single run going and delivers each bar as it closes
     logging.info("Started trading loop")
     while True:
         try:
-            cerebro.run()
+            cerebro.run(exactbars=1)
         except Exception as e:
             logging.error(f"Error running strategy: {e}")
-        time.sleep(60) # Sleep for 1 minute before running again. Adjust this if needed.
+        time.sleep(60) # Wait before restarting the run after an error. Adjust this if needed.
@@ -0,0 +1,240 @@
+import logging
+from collections import namedtuple
+import numpy as np
+from strats.GoatSignals import compute_signals
+
+try:
+    from numba import njit
+except ImportError:
+    # Same results without numba, only at pure Python loop speed
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+logger = logging.getLogger(__name__)
+
+FastResult = namedtuple('FastResult', ['equity', 'position', 'fills', 'trades', 'final_value'])
+Fills = namedtuple('Fills', ['bar', 'size', 'price', 'commission'])
+Trades = namedtuple('Trades', ['open_bar', 'close_bar', 'pnl', 'pnlcomm'])
+
+# Bars per kernel call. A call's fill buffers hold the most fills its bars can produce, so they never grow
+# inside the loop, where reassigning arrays costs reference counting on every bar.
+chunk_bars = 65_536
+
+# Slots of the state array carried from one kernel call to the next
+CASH, SIZE, PRICE, OPEN_BAR, OPEN_PNL, OPEN_COMM, PENDING = range(7)
+
+@njit(cache=True)
+def _update(size, price, delta, exec_price):
+    """Apply a fill to a position like backtrader's Position.update and return (size, price, opened, closed)."""
+    new_size = size + delta
+    if new_size == 0:
+        return 0.0, 0.0, 0.0, delta
+    if size == 0:
+        return new_size, exec_price, delta, 0.0
+    if size > 0:
+        if delta > 0:
+            return new_size, (price * size + delta * exec_price) / new_size, delta, 0.0
+        if new_size > 0:
+            return new_size, price, 0.0, delta
+        return new_size, exec_price, new_size, -size
+    if delta < 0:
+        return new_size, (price * size + delta * exec_price) / new_size, delta, 0.0
+    if new_size < 0:
+        return new_size, price, 0.0, delta
+    return new_size, exec_price, new_size, -size
+
+@njit(cache=True)
+def _run(open_, close, long_entry, short_entry, long_exit, short_exit, commission, risk_amount,
+         stop_loss, max_trade_percentage, pyramid_num, pyramid_size_ratio,
+         start, stop, state, pending_size, pending_price, equity, position):
+    """Run bars [start, stop), writing equity and position in place and returning the fills and closed trades."""
+    capacity = (stop - start) * (pyramid_num + 2)
+    fill_bar = np.empty(capacity, dtype=np.int64)
+    fill_size = np.empty(capacity)
+    fill_price = np.empty(capacity)
+    fill_comm = np.empty(capacity)
+    fills = 0
+
+    trade_open = np.empty(capacity, dtype=np.int64)
+    trade_close = np.empty(capacity, dtype=np.int64)
+    trade_pnl = np.empty(capacity)
+    trade_pnlcomm = np.empty(capacity)
+    trades = 0
+
+    cash = state[CASH]
+    size = state[SIZE]
+    price = state[PRICE]
+    open_bar = int(state[OPEN_BAR])
+    open_pnl = state[OPEN_PNL]
+    open_comm = state[OPEN_COMM]
+    pending = int(state[PENDING])
+    accepted = np.empty(pyramid_num + 2, dtype=np.bool_)
+
+    for i in range(start, stop):
+        if pending:
+            # Submission check: orders are pseudo-executed in sequence at their creation price
+            check_cash = cash
+            check_size = size
+            check_price = price
+            for k in range(pending):
+                check_size, check_price, opened, closed = _update(check_size, check_price, pending_size[k], pending_price[k])
+                if closed != 0:
+                    check_cash += -closed * pending_price[k] + 0.0
+                    check_cash -= abs(closed) * commission * pending_price[k]
+                if opened != 0:
+                    check_cash -= opened * pending_price[k]
+                    check_cash -= abs(opened) * commission * pending_price[k]
+                accepted[k] = check_cash >= 0.0
+
+            # Accepted market orders fill at this bar's open
+            exec_price = open_[i]
+            for k in range(pending):
+                if not accepted[k]:
+                    continue
+                _, _, opened, closed = _update(size, price, pending_size[k], exec_price)
+                closed_comm = 0.0
+                opened_comm = 0.0
+                pnl = 0.0
+                if closed != 0:
+                    pnl = -closed * (exec_price - price) * 1.0
+                    cash += -closed * price + pnl
+                    closed_comm = abs(closed) * commission * exec_price
+                    cash -= closed_comm
+                if opened != 0:
+                    opened_comm = abs(opened) * commission * exec_price
+                    remaining = cash - opened * exec_price
+                    remaining -= opened_comm
+                    if remaining < 0.0:
+                        opened = 0.0
+                        opened_comm = 0.0
+                    else:
+                        cash = remaining
+
+                executed = closed + opened
+                if executed == 0:
+                    continue
+
+                was_open = size != 0
+                size, price, _, _ = _update(size, price, executed, exec_price)
+
+                fill_bar[fills] = i
+                fill_size[fills] = executed
+                fill_price[fills] = exec_price
+                fill_comm[fills] = closed_comm + opened_comm
+                fills += 1
+
+                # Round trips: a trade ends when the position goes flat or reverses
+                if was_open:
+                    open_pnl += pnl
+                    open_comm += closed_comm
+                    if closed != 0 and (size == 0 or opened != 0):
+                        trade_open[trades] = open_bar
+                        trade_close[trades] = i
+                        trade_pnl[trades] = open_pnl
+                        trade_pnlcomm[trades] = open_pnl - open_comm
+                        trades += 1
+                        was_open = False
+                if not was_open and size != 0:
+                    open_bar = i
+                    open_pnl = 0.0
+                    open_comm = opened_comm
+                elif opened != 0:
+                    open_comm += opened_comm
+            pending = 0
+
+        # Broker value at the close, computed as backtrader does for shortcash positions
+        value = size * close[i]
+        if value > 0:
+            unrealized = size * (close[i] - price) * 1.0
+            value = (value - unrealized) / 1.0 + unrealized
+        equity[i] = cash + value
+        position[i] = size
+
+        # Strategy decision on the closed bar, orders go out at the next open
+        if cash == 0:
+            continue
+        bar_close = close[i]
+        potential_loss = bar_close - bar_close * (1 - stop_loss)
+        trade_size = risk_amount / potential_loss
+        total_size = (max_trade_percentage / 100) * cash / bar_close
+
+        for _ in range(pyramid_num):
+            pyramid_size = total_size * pyramid_size_ratio
+            if pyramid_size > 0:
+                if size > 0:
+                    pending_size[pending] = pyramid_size
+                    pending_price[pending] = bar_close
+                    pending += 1
+                elif size < 0:
+                    pending_size[pending] = -pyramid_size
+                    pending_price[pending] = bar_close
+                    pending += 1
+                total_size += pyramid_size
+
+        if size == 0:
+            if long_entry[i]:
+                pending_size[pending] = trade_size
+                pending_price[pending] = bar_close
+                pending += 1
+            elif short_entry[i]:
+                pending_size[pending] = -trade_size
+                pending_price[pending] = bar_close
+                pending += 1
+
+        if size > 0 and long_exit[i]:
+            pending_size[pending] = -size
+            pending_price[pending] = bar_close
+            pending += 1
+        elif size < 0 and short_exit[i]:
+            pending_size[pending] = -size
+            pending_price[pending] = bar_close
+            pending += 1
+
+    state[CASH] = cash
+    state[SIZE] = size
+    state[PRICE] = price
+    state[OPEN_BAR] = open_bar
+    state[OPEN_PNL] = open_pnl
+    state[OPEN_COMM] = open_comm
+    state[PENDING] = pending
+    return (fill_bar[:fills].copy(), fill_size[:fills].copy(), fill_price[:fills].copy(), fill_comm[:fills].copy(),
+            trade_open[:trades].copy(), trade_close[:trades].copy(), trade_pnl[:trades].copy(), trade_pnlcomm[:trades].copy())
+
+def run_fast(arrays, params, cash=1000.0, commission=0.001, risk_percentage=0.01, account_size=1000.0, signals=None):
+    """Run GoatStrat's entry, exit, pyramiding and commission rules over CandleArrays in one compiled loop.
+
+    Orders placed on a bar fill at the next bar's open and are checked against cash the way backtrader's
+    BackBroker does, so the fills and equity curve can be compared with a Cerebro run of GoatStrat.
+    """
+    if signals is None:
+        signals = compute_signals(
+            arrays.close, arrays.volume, params['bb_length'], params['mult'], params['rsi_period'], params['vol_period'],
+            params['entry_rsi'], params['exit_rsi'], params['entry_vol'], params['exit_vol'],
+            params['trailing_stop'], params['profit_target'],
+        )
+
+    open_, close = np.ascontiguousarray(arrays.open), np.ascontiguousarray(arrays.close)
+    n = len(close)
+    pyramid_num = int(params['pyramid_num'])
+    equity = np.empty(n)
+    position = np.empty(n)
+    state = np.array([float(cash), 0.0, 0.0, -1.0, 0.0, 0.0, 0.0])
+    pending_size = np.empty(pyramid_num + 2)
+    pending_price = np.empty(pyramid_num + 2)
+
+    chunks = []
+    # An empty range still makes one call, for correctly typed empty results
+    for start in range(0, max(n, 1), chunk_bars):
+        chunks.append(_run(
+            open_, close, signals.long_entry, signals.short_entry, signals.long_exit, signals.short_exit,
+            float(commission), float(risk_percentage * account_size), float(params['stop_loss']),
+            float(params['max_trade_percentage']), pyramid_num, float(params['pyramid_size_ratio']),
+            start, min(start + chunk_bars, n), state, pending_size, pending_price, equity, position,
+        ))
+    columns = [np.concatenate(column) for column in zip(*chunks)]
+    fills = Fills(*columns[:4])
+    trades = Trades(*columns[4:])
+    final_value = float(equity[-1]) if len(equity) else float(cash)
+    return FastResult(equity, position, fills, trades, final_value)
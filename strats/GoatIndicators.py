@@ -0,0 +1,135 @@
+import math
+from collections import namedtuple
+
+GoatValues = namedtuple('GoatValues', ['basis', 'dev', 'upper', 'lower', 'rsi', 'vol_sma'])
+
+class RollingStats:
+    """Mean and population variance of the last `period` values, updated in O(1) per value (Welford).
+
+    update() adds a closed value, peek() returns what the statistics would be with one more value without
+    changing the state. Both return NaN until `period` values are available, like backtrader's SMA.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.window = [0.0] * period
+        self.index = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _add(self, value):
+        """Return (count, mean, m2) after adding `value`, replacing the oldest value once the window is full."""
+        if self.count < self.period:
+            count = self.count + 1
+            delta = value - self.mean
+            mean = self.mean + delta / count
+            return count, mean, self.m2 + delta * (value - mean)
+        oldest = self.window[self.index]
+        delta = value - oldest
+        mean = self.mean + delta / self.period
+        return self.count, mean, self.m2 + delta * (value - mean + oldest - self.mean)
+
+    def _result(self, count, mean, m2):
+        if count < self.period:
+            return math.nan, math.nan
+        return mean, max(m2 / count, 0.0)
+
+    def update(self, value):
+        """Add a closed value and return (mean, variance)."""
+        self.count, self.mean, self.m2 = self._add(value)
+        self.window[self.index] = value
+        self.index = (self.index + 1) % self.period
+
+        # Re-sum the window once per pass so rounding errors of the running updates can't pile up
+        if self.index == 0 and self.count == self.period:
+            self.mean = math.fsum(self.window) / self.period
+            self.m2 = math.fsum((x - self.mean) ** 2 for x in self.window)
+        return self._result(self.count, self.mean, self.m2)
+
+    def peek(self, value):
+        """Return (mean, variance) as if `value` were the next value, without adding it."""
+        return self._result(*self._add(value))
+
+class EMA:
+    """Exponential moving average seeded with the mean of the first `period` values, as in backtrader."""
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (1.0 + period)
+        self.alpha1 = 1.0 - self.alpha
+        self.seed = []
+        self.value = math.nan
+
+    def _add(self, value):
+        if self.seed is None:
+            return self.value * self.alpha1 + value * self.alpha
+        if len(self.seed) + 1 == self.period:
+            return math.fsum(self.seed + [value]) / self.period
+        return math.nan
+
+    def update(self, value):
+        """Add a closed value and return the average."""
+        self.value = self._add(value)
+        if self.seed is not None:
+            self.seed.append(value)
+            if len(self.seed) == self.period:
+                self.seed = None
+        return self.value
+
+    def peek(self, value):
+        """Return the average as if `value` were the next value, without adding it."""
+        return self._add(value)
+
+class RSI:
+    """RSI with EMA-smoothed up and down moves (backtrader's RSI_EMA)."""
+
+    def __init__(self, period):
+        self.up = EMA(period)
+        self.down = EMA(period)
+        self.last_close = None
+
+    @staticmethod
+    def _rsi(up, down):
+        if down == 0:
+            # Same as the NumPy path: no down moves is 100, no moves at all is undefined
+            return 100.0 if up > 0 else math.nan
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+    def update(self, close):
+        """Add a closed bar's close and return the RSI."""
+        if self.last_close is None:
+            self.last_close = close
+            return math.nan
+        change = close - self.last_close
+        self.last_close = close
+        return self._rsi(self.up.update(max(change, 0.0)), self.down.update(max(-change, 0.0)))
+
+    def peek(self, close):
+        """Return the RSI as if the current bar closed at `close`, without adding it."""
+        if self.last_close is None:
+            return math.nan
+        change = close - self.last_close
+        return self._rsi(self.up.peek(max(change, 0.0)), self.down.peek(max(-change, 0.0)))
+
+class GoatIndicators:
+    """GoatStrat's Bollinger bands, RSI and volume SMA with O(1) updates on closed bars and provisional peeks on ticks."""
+
+    def __init__(self, bb_length, mult, rsi_period, vol_period):
+        self.mult = mult
+        self.bands = RollingStats(bb_length)
+        self.rsi = RSI(rsi_period)
+        self.volume = RollingStats(vol_period)
+
+    def _values(self, bands, rsi, volume):
+        basis, variance = bands
+        dev = self.mult * math.sqrt(variance)
+        return GoatValues(basis, dev, basis + dev, basis - dev, rsi, volume[0])
+
+    def update(self, close, volume):
+        """Add a closed bar and return its GoatValues."""
+        return self._values(self.bands.update(close), self.rsi.update(close), self.volume.update(volume))
+
+    def peek(self, close, volume):
+        """Return the GoatValues of the forming bar at the last trade price and the volume traded so far."""
+        return self._values(self.bands.peek(close), self.rsi.peek(close), self.volume.peek(volume))
@@ -0,0 +1,109 @@
+import math
+from collections import namedtuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+GoatSignals = namedtuple('GoatSignals', [
+    'basis', 'dev', 'upper', 'lower', 'rsi', 'vol_sma',
+    'long_entry', 'short_entry', 'long_exit', 'short_exit',
+])
+
+def sma(values, period):
+    """Simple moving average, NaN until `period` values are available (backtrader's SMA)."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1:] = sliding_window_view(values, period).sum(axis=1) / period
+    return out
+
+def stddev(values, period):
+    """Population standard deviation computed like backtrader's StdDev: sqrt(SMA(x^2) - SMA(x)^2)."""
+    return np.sqrt(np.maximum(sma(values * values, period) - sma(values, period) ** 2, 0.0))
+
+def _ema_recurrence(values, prev, alpha):
+    """Run the EMA recurrence over `values` from the seed `prev`, the one step that can't be vectorized."""
+    out = np.empty(len(values))
+    alpha1 = 1.0 - alpha
+    for i in range(len(values)):
+        prev = prev * alpha1 + values[i] * alpha
+        out[i] = prev
+    return out
+
+if njit is not None:
+    _ema_recurrence = njit(cache=True)(_ema_recurrence)
+else:
+    def _ema_recurrence(values, prev, alpha):
+        # Python floats from tolist() step faster than NumPy scalars
+        alpha1 = 1.0 - alpha
+        result = []
+        for value in values.tolist():
+            prev = prev * alpha1 + value * alpha
+            result.append(prev)
+        return np.array(result, dtype=np.float64)
+
+def ema(values, period, first):
+    """Exponential moving average seeded with the mean of the `period` values from index `first`, as in backtrader."""
+    out = np.full(len(values), np.nan)
+    seed = first + period - 1
+    if len(values) <= seed:
+        return out
+
+    alpha = 2.0 / (1.0 + period)
+    prev = math.fsum(values[first:seed + 1]) / period
+    out[seed] = prev
+    out[seed + 1:] = _ema_recurrence(np.ascontiguousarray(values[seed + 1:], dtype=np.float64), prev, alpha)
+    return out
+
+def rsi_ema(close, period):
+    """RSI smoothed with EMAs of up and down moves (backtrader's RSI_EMA)."""
+    change = np.full(len(close), np.nan)
+    change[1:] = close[1:] - close[:-1]
+    up = ema(np.maximum(change, 0.0), period, 1)
+    down = ema(np.maximum(-change, 0.0), period, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+def signal_conditions(close, volume, dev, upper, lower, rsi, vol_sma, entry_rsi, exit_rsi, entry_vol, exit_vol, trailing_stop, profit_target):
+    """Return GoatStrat's (long entry, short entry, long exit, short exit) conditions for arrays or single bars."""
+    with np.errstate(invalid='ignore'):
+        long_entry = (close > upper) & (rsi > entry_rsi) & (volume > entry_vol * vol_sma)
+        short_entry = (close < lower) & (rsi < entry_rsi) & (volume > entry_vol * vol_sma)
+        long_exit = (
+            (close < close - trailing_stop / 100 * dev)
+            | (close > close + profit_target / 100 * dev)
+            | (rsi < exit_rsi)
+            | (volume < exit_vol * vol_sma)
+        )
+        short_exit = (
+            (close > close + trailing_stop / 100 * dev)
+            | (close < close - profit_target / 100 * dev)
+            | (rsi > 100 - exit_rsi)
+            | (volume < exit_vol * vol_sma)
+        )
+    return long_entry, short_entry, long_exit, short_exit
+
+def compute_signals(close, volume, bb_length, mult, rsi_period, vol_period, entry_rsi, exit_rsi, entry_vol, exit_vol, trailing_stop, profit_target):
+    """Compute GoatStrat's indicators and entry/exit conditions for every bar at once.
+
+    Bars whose indicators are still warming up compare as NaN and never signal.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+
+    basis = sma(close, bb_length)
+    dev = mult * stddev(close, bb_length)
+    upper = basis + dev
+    lower = basis - dev
+    rsi = rsi_ema(close, rsi_period)
+    vol_sma = sma(volume, vol_period)
+
+    long_entry, short_entry, long_exit, short_exit = signal_conditions(
+        close, volume, dev, upper, lower, rsi, vol_sma,
+        entry_rsi, exit_rsi, entry_vol, exit_vol, trailing_stop, profit_target,
+    )
+
+    return GoatSignals(basis, dev, upper, lower, rsi, vol_sma, long_entry, short_entry, long_exit, short_exit)
@@ -1,10 +1,12 @@
 import backtrader as bt
 import os
 import logging
-from binance.client import Client
+import numpy as np
 from dotenv import load_dotenv
-from utils.Broker import BinanceBroker
 from utils.Risk import position_size, RISK_PERCENTAGE, ACCOUNT_SIZE
+from utils.Clients import get_client
+from strats.GoatSignals import compute_signals, signal_conditions
+from strats.GoatIndicators import GoatIndicators
 
 # Load environment variables
 load_dotenv()
@@ -40,6 +42,8 @@ class GoatStrat(bt.Strategy):
         mult = float(os.getenv("MULT")),
         trailing_stop = float(os.getenv("TRAILING_STOP")),
         profit_target = float(os.getenv("PROFIT_TARGET")),
+        stop_loss = float(os.getenv("STOP_LOSS", 0.02)),
+        take_profit = float(os.getenv("TAKE_PROFIT", 0.04)),
         rsi_period = int(os.getenv("RSI_PERIOD")),
         vol_period = int(os.getenv("VOL_PERIOD")),
         entry_rsi = float(os.getenv("ENTRY_RSI")),
@@ -53,6 +57,11 @@ class GoatStrat(bt.Strategy):
         exchange = os.getenv('EXCHANGE'),
         leverage = int(os.getenv('LEVERAGE')),
         margin_type = os.getenv('MARGIN_TYPE'),
+        client = None,  # Binance client to use instead of the shared one
+        symbol = None,  # Name of the data feed to trade, the first one if not set
+        risk_budget = None,  # RiskBudget shared by the strategies of a portfolio
+        protective_exits = os.getenv('PROTECTIVE_EXITS') == 'True',  # Keep stop loss and profit target orders on open positions
+        live_broker = None,  # BatchingBroker the market orders are sent to, one batch per bar
     )
 
     def __init__(self):
@@ -78,25 +87,68 @@ class GoatStrat(bt.Strategy):
         self.exchange = self.params.exchange
         self.leverage = self.params.leverage
         self.margin_type = self.params.margin_type
-        self.basis = bt.indicators.SimpleMovingAverage(self.data.close, period=self.bb_length)
-        self.dev = self.mult * bt.indicators.StdDev(self.data.close, period=self.bb_length)
-        self.upper1 = self.basis + self.dev
-        self.lower1 = self.basis - self.dev
-        self.rsi = bt.indicators.RSI_EMA(self.data.close, period=self.rsi_period)
-        self.vol = self.data.volume
-
-        if self.use_testnet:
-            self.client = Client(self.binance_testnet_key, self.binance_testnet_secret, testnet=True)
+        # In a portfolio every symbol has its own GoatStrat on the data feed named after it
+        self.feed = self.getdatabyname(self.params.symbol) if self.params.symbol else self.datas[0]
+        self.risk_budget = self.params.risk_budget
+        self.last_bar = 0
+        self.vol = self.feed.volume
+        self.protective_orders = []
+        # Orders only reach the live broker once the feed is done replaying its history
+        self.live = False
+        # Market orders queued on the live broker this bar, placed in the simulation once accepted
+        self.live_orders = []
+        # The stop and limit exits would only fill in the simulation and leave the exchange position open
+        if self.params.protective_exits and self.params.live_broker is not None:
+            raise ValueError("PROTECTIVE_EXITS only works in backtests, the live broker sends market orders only")
+
+        # With preloaded data every indicator and condition is computed once over the full arrays
+        self.signals = None
+        if self.feed.buflen() > 0:
+            self.signals = compute_signals(
+                np.frombuffer(self.feed.close.array, dtype=np.float64),
+                np.frombuffer(self.feed.volume.array, dtype=np.float64),
+                self.bb_length, self.mult, self.rsi_period, self.vol_period, self.entry_rsi, self.exit_rsi,
+                self.entry_vol, self.exit_vol, self.trailing_stop, self.profit_target,
+            )
         else:
-            self.client = Client(self.binance_api_key, self.binance_api_secret)
+            # Live bars update the indicators in O(1), ticks of the forming bar can peek at them
+            self.indicators = GoatIndicators(self.bb_length, self.mult, self.rsi_period, self.vol_period)
+            self.values = None
+
+        # Created on first use, backtests never touch the exchange
+        self._client = self.params.client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    def notify_data(self, data, status, *args, **kwargs):
+        if data is self.feed:
+            self.live = status == data.LIVE
 
     def next(self):
+        # With several feeds next() also runs when only another symbol has a new bar
+        if len(self.feed) == self.last_bar:
+            return
+        self.last_bar = len(self.feed)
+
+        position = self.getposition(self.feed)
+
+        # Market orders resolve by the next bar, so a flat position no longer holds any risk
+        if self.risk_budget is not None and position.size == 0:
+            self.risk_budget.release(self.feed._name)
+
+        if self.signals is None:
+            self.values = self.indicators.update(self.feed.close[0], self.vol[0])
+
         # Get current cash balance
         cash = self.broker.get_cash()
         if cash == 0:
             return
 
-        price = self.data.close[0]
+        price = self.feed.close[0]
         stop_loss = price * (1 - self.params.stop_loss)
         take_profit = price * (1 + self.params.take_profit)
 
@@ -105,7 +157,7 @@ class GoatStrat(bt.Strategy):
         
         # Calculate trade size based on max_trade_percentage
         max_trade_percentage = self.params.max_trade_percentage
-        price = self.data.close[0]
+        price = self.feed.close[0]
         size = (max_trade_percentage / 100) * cash / price
 
         # Calculate additional trade sizes based on pyramid_num and pyramid_size_ratio
@@ -114,55 +166,129 @@ class GoatStrat(bt.Strategy):
             pyr_size = total_size * self.pyramid_size_ratio
             if pyr_size > 0:
                 logger.debug(f"Adding pyramid position {i} of size {pyr_size:.2f}")
-                if self.position.size > 0:
-                    self.buy(size=pyr_size)
-                elif self.position.size < 0:
-                    self.sell(size=pyr_size)
+                if position.size > 0:
+                    self.buy(data=self.feed, size=pyr_size)
+                elif position.size < 0:
+                    self.sell(data=self.feed, size=pyr_size)
                 total_size += pyr_size
 
+        long_entry, short_entry, long_exit_condition, short_exit_condition = self.conditions()
+
+        # Scale the entry down to the risk the portfolio budget has left
+        if self.risk_budget is not None and position.size == 0 and (long_entry or short_entry):
+            trade_size = self.risk_budget.reserve(self.feed._name, trade_size * potential_loss) / potential_loss
+
         # Enter long or short trade based on the entry conditions
-        if self.position.size == 0:
-            if self.data.close[0] > self.upper1[0] and self.rsi[0] > self.entry_rsi and self.vol[0] > self.entry_vol * bt.indicators.SMA(self.vol, period=self.vol_period)[0]:
+        if position.size == 0 and trade_size > 0:
+            if long_entry:
                 logger.debug(f"Entering long trade of size {trade_size:.2f}")
-                self.buy(size=trade_size)
-                self.params.stop_loss = stop_loss
-                self.params.take_profit = take_profit
-            elif self.data.close[0] < self.lower1[0] and self.rsi[0] < self.entry_rsi and self.vol[0] > self.entry_vol * bt.indicators.SMA(self.vol, period=self.vol_period)[0]:
+                self.buy(data=self.feed, size=trade_size)
+                self.stop_loss = stop_loss
+                self.take_profit = take_profit
+            elif short_entry:
                 logger.debug(f"Entering short trade of size {trade_size:.2f}")
-                self.sell(size=trade_size)
-                self.params.stop_loss = stop_loss
-                self.params.take_profit = take_profit
-                
-        # Define the trailing stop and profit target price levels
-        long_trailing_stop = self.data.close[0] - self.trailing_stop / 100 * self.dev[0]
-        long_profit_target = self.data.close[0] + self.profit_target / 100 * self.dev[0]
-        short_trailing_stop = self.data.close[0] + self.trailing_stop / 100 * self.dev[0]
-        short_profit_target = self.data.close[0] - self.profit_target / 100 * self.dev[0]       
-
-        # Define exit conditions for long and short positions
-        long_exit_condition = (
-            self.data.close[0] < long_trailing_stop
-            or self.data.close[0] > long_profit_target
-            or self.rsi[0] < self.exit_rsi
-            or self.vol[0] < self.exit_vol * bt.indicators.SMA(self.vol, period=self.vol_period)[0]
-        )
-        short_exit_condition = (
-            self.data.close[0] > short_trailing_stop
-            or self.data.close[0] < short_profit_target
-            or self.rsi[0] > 100 - self.exit_rsi
-            or self.vol[0] < self.exit_vol * bt.indicators.SMA(self.vol, period=self.vol_period)[0]
-        )       
+                self.sell(data=self.feed, size=trade_size)
+                self.stop_loss = stop_loss
+                self.take_profit = take_profit
 
         # Exit long or short positions based on the exit conditions
-        if self.position.size > 0 and long_exit_condition:
+        exiting = (position.size > 0 and long_exit_condition) or (position.size < 0 and short_exit_condition)
+        if position.size > 0 and long_exit_condition:
             logger.debug("Exiting long trade")
-            self.close()
-        elif self.position.size < 0 and short_exit_condition:
+            self.close(data=self.feed)
+        elif position.size < 0 and short_exit_condition:
             logger.debug("Exiting short trade")
-            self.close()        
+            self.close(data=self.feed)
+
+        if self.params.protective_exits:
+            self.protect(position, exiting)
+
+        self.flush_live()
+
+    def buy(self, data=None, size=None, exectype=None, **kwargs):
+        if self.sends_live(exectype):
+            return self.queue_live(True, data, size, kwargs)
+        return super(GoatStrat, self).buy(data=data, size=size, exectype=exectype, **kwargs)
+
+    def sell(self, data=None, size=None, exectype=None, **kwargs):
+        if self.sends_live(exectype):
+            return self.queue_live(False, data, size, kwargs)
+        return super(GoatStrat, self).sell(data=data, size=size, exectype=exectype, **kwargs)
+
+    def sends_live(self, exectype):
+        return self.params.live_broker is not None and self.live and exectype in (None, bt.Order.Market)
+
+    def queue_live(self, isbuy, data, size, kwargs):
+        """Queue a market order on the live broker, close() goes through buy() and sell() too.
+
+        The simulated order is only placed by flush_live() once the exchange has accepted the live one,
+        so an order the broker rejects doesn't fill in the simulation either. Stop and limit orders stay
+        with the Cerebro broker.
+        """
+        # The bar's close lets the broker check the order's notional against the symbol filters
+        price = (data if data is not None else self.datas[0]).close[0]
+        live_broker = self.params.live_broker
+        if (live_broker.buy if isbuy else live_broker.sell)(abs(size), price):
+            self.live_orders.append((isbuy, data, size, kwargs))
+        return None
+
+    def flush_live(self):
+        """Post the market orders queued on the live broker during this bar and mirror the accepted ones."""
+        orders, self.live_orders = self.live_orders, []
+        if not orders:
+            return
+        for (isbuy, data, size, kwargs), result in zip(orders, self.params.live_broker.flush()):
+            if 'orderId' not in result:
+                logger.warning(f"Skipping the simulated {'buy' if isbuy else 'sell'} of {size}, the exchange rejected it: {result.get('msg')}")
+                continue
+            place = super(GoatStrat, self).buy if isbuy else super(GoatStrat, self).sell
+            place(data=data, size=size, **kwargs)
+
+    def protect(self, position, exiting):
+        """Replace the stop loss and profit target orders so they cover the position around its average price.
+
+        The two orders are one OCO pair and are dropped while the position is flat or being closed.
+        """
+        for order in self.protective_orders:
+            self.cancel(order)
+        self.protective_orders = []
+        if position.size == 0 or exiting:
+            return
+
+        size = abs(position.size)
+        if position.size > 0:
+            stop = self.sell(data=self.feed, size=size, exectype=bt.Order.Stop, price=position.price * (1 - self.params.stop_loss))
+            target = self.sell(data=self.feed, size=size, exectype=bt.Order.Limit, price=position.price * (1 + self.params.take_profit), oco=stop)
+        else:
+            stop = self.buy(data=self.feed, size=size, exectype=bt.Order.Stop, price=position.price * (1 + self.params.stop_loss))
+            target = self.buy(data=self.feed, size=size, exectype=bt.Order.Limit, price=position.price * (1 - self.params.take_profit), oco=stop)
+        self.protective_orders = [stop, target]
+
+    def conditions(self):
+        """Return the (long entry, short entry, long exit, short exit) conditions of the current bar."""
+        if self.signals is not None:
+            i = len(self.feed) - 1
+            return (self.signals.long_entry[i], self.signals.short_entry[i],
+                    self.signals.long_exit[i], self.signals.short_exit[i])
+
+        return self.signal_conditions(self.feed.close[0], self.vol[0], self.values)
+
+    def signal_conditions(self, close, volume, values):
+        return signal_conditions(
+            close, volume, values.dev, values.upper, values.lower, values.rsi, values.vol_sma,
+            self.entry_rsi, self.exit_rsi, self.entry_vol, self.exit_vol, self.trailing_stop, self.profit_target,
+        )
+
+    def provisional_conditions(self, price, volume):
+        """Return the conditions of the forming bar at the last trade price and the volume traded so far.
+
+        Only available with live (not preloaded) data, the indicator state is left untouched.
+        """
+        return self.signal_conditions(price, volume, self.indicators.peek(price, volume))
 
     @staticmethod
     def getbroker():
+        from utils.Broker import BinanceBroker
         api_key = os.getenv('BINANCE_API_KEY')
         api_secret = os.getenv('BINANCE_API_SECRET')
         use_testnet = os.getenv('USE_TESTNET') == 'True'
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import namedtuple, deque
+import websockets
+from dotenv import load_dotenv
+from .Clients import get_client
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/broker.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+use_testnet = os.getenv('USE_TESTNET') == 'True'
+
+# User Data Stream Setting
+if use_testnet:
+    user_stream_url = os.getenv('USER_STREAM_URL', 'wss://stream.binancefuture.com/ws')
+else:
+    user_stream_url = os.getenv('USER_STREAM_URL', 'wss://fstream.binance.com/ws')
+keepalive_interval = float(os.getenv('LISTEN_KEY_KEEPALIVE', 1800))  # Binance expires a listenKey after 60 minutes without one
+reconnect_delay = float(os.getenv('STREAM_RECONNECT_DELAY', 1))  # Initial delay in seconds, doubled up to 60s
+fills_kept = int(os.getenv('ACCOUNT_FILLS_KEPT', 1000))
+
+Balance = namedtuple('Balance', ['asset', 'wallet', 'cross_wallet', 'available'])
+Position = namedtuple('Position', ['symbol', 'amount', 'entry_price', 'unrealized_pnl', 'margin_type', 'isolated_wallet'])
+Order = namedtuple('Order', ['order_id', 'symbol', 'side', 'type', 'quantity', 'price', 'filled', 'status'])
+Fill = namedtuple('Fill', ['trade_id', 'order_id', 'symbol', 'side', 'price', 'quantity', 'commission', 'commission_asset', 'realized_pnl', 'time'])
+
+FLAT = Position(None, 0.0, 0.0, 0.0, None, 0.0)
+
+# Order states after which an order is no longer open
+CLOSED_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
+class AccountMirror:
+    """In-memory copy of the futures account fed by the user data stream.
+
+    Every entry is an immutable namedtuple replaced whole, so other threads read balances, positions and
+    open orders with a dict lookup and no lock. The state is only loaded over REST when the stream
+    (re)connects.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self.balances = {}
+        self.positions = {}
+        self.orders = {}
+        self.assets = {}  # Raw REST account assets, for fields the stream doesn't carry
+        self.fills = deque(maxlen=fills_kept)
+        self.fill_ids = set()
+        self.on_fill = []  # Callbacks called with each new Fill
+        self.on_reconnect = []  # Callbacks called after each REST reconciliation
+        self.synced = False
+        self.updated = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    # Reads
+
+    def balance(self, asset='USDT'):
+        """Return the wallet balance of `asset`."""
+        entry = self.balances.get(asset)
+        return entry.wallet if entry else 0.0
+
+    def available(self, asset='USDT'):
+        """Return the balance of `asset` available for new orders at the last reconciliation.
+
+        The stream carries no available balance, so this only follows wallet changes since and never
+        drops by the margin that new positions and orders lock. Don't size orders from it.
+        """
+        entry = self.balances.get(asset)
+        return entry.available if entry else 0.0
+
+    def position(self, symbol):
+        """Return the Position of `symbol`, FLAT when there is none."""
+        return self.positions.get(symbol, FLAT)
+
+    def open_orders(self, symbol=None):
+        return [order for order in list(self.orders.values()) if symbol is None or order.symbol == symbol]
+
+    def recent_fills(self, symbol=None):
+        return [fill for fill in list(self.fills) if symbol is None or fill.symbol == symbol]
+
+    def asset(self, name):
+        return self.assets.get(name, {})
+
+    # Updates
+
+    def reconcile(self):
+        """Replace the state with the REST account snapshot and open orders.
+
+        The mirror is only marked synced by whoever applies the stream events that arrived meanwhile.
+        """
+        started = time.perf_counter()
+        account = self.client.futures_account()
+        open_orders = self.client.futures_get_open_orders()
+
+        self.assets = {}
+        for entry in account.get('userAssets', []) + account.get('assets', []):
+            self.assets[entry['asset']] = {**self.assets.get(entry['asset'], {}), **entry}
+        self.balances = {
+            entry['asset']: Balance(entry['asset'], float(entry['walletBalance']), float(entry.get('crossWalletBalance', entry['walletBalance'])),
+                                    float(entry.get('availableBalance', entry['walletBalance'])))
+            for entry in account.get('assets', [])
+        }
+        self.positions = {
+            entry['symbol']: Position(entry['symbol'], float(entry['positionAmt']), float(entry['entryPrice']),
+                                      float(entry.get('unrealizedProfit', 0)), 'isolated' if entry.get('isolated') else 'cross',
+                                      float(entry.get('isolatedWallet', 0)))
+            for entry in account.get('positions', []) if float(entry['positionAmt']) != 0
+        }
+        self.orders = {
+            int(entry['orderId']): Order(int(entry['orderId']), entry['symbol'], entry['side'], entry['type'], float(entry['origQty']),
+                                         float(entry['price']), float(entry['executedQty']), entry['status'])
+            for entry in open_orders
+        }
+        self.updated = time.time()
+        logger.info(f"Reconciled account over REST in {time.perf_counter() - started:.2f}s: {len(self.positions)} positions, {len(self.orders)} open orders")
+        for callback in self.on_reconnect:
+            callback(self)
+
+    def apply(self, event):
+        """Apply one user data stream event."""
+        kind = event.get('e')
+        if kind == 'ACCOUNT_UPDATE':
+            self.apply_account(event['a'])
+        elif kind == 'ORDER_TRADE_UPDATE':
+            self.apply_order(event['o'])
+        elif kind == 'MARGIN_CALL':
+            logger.warning(f"Margin call: {event}")
+        self.updated = time.time()
+
+    def apply_account(self, update):
+        for entry in update.get('B', []):
+            wallet = float(entry['wb'])
+            previous = self.balances.get(entry['a'])
+            # The stream has no available balance, it moves with the wallet until the next reconciliation
+            available = previous.available + wallet - previous.wallet if previous else wallet
+            self.balances[entry['a']] = Balance(entry['a'], wallet, float(entry['cw']), available)
+        for entry in update.get('P', []):
+            amount = float(entry['pa'])
+            if amount == 0:
+                self.positions.pop(entry['s'], None)
+            else:
+                self.positions[entry['s']] = Position(entry['s'], amount, float(entry['ep']), float(entry['up']),
+                                                      entry.get('mt'), float(entry.get('iw', 0)))
+
+    def apply_order(self, update):
+        order_id = int(update['i'])
+        if update['X'] in CLOSED_STATUSES:
+            self.orders.pop(order_id, None)
+        else:
+            self.orders[order_id] = Order(order_id, update['s'], update['S'], update['o'], float(update['q']),
+                                          float(update['p']), float(update['z']), update['X'])
+
+        if update['x'] == 'TRADE' and int(update['t']) not in self.fill_ids:
+            fill = Fill(int(update['t']), order_id, update['s'], update['S'], float(update['L']), float(update['l']),
+                        float(update.get('n', 0)), update.get('N'), float(update.get('rp', 0)), int(update['T']))
+            if len(self.fills) == self.fills.maxlen:
+                self.fill_ids.discard(self.fills[0].trade_id)
+            self.fills.append(fill)
+            self.fill_ids.add(fill.trade_id)
+            for callback in self.on_fill:
+                callback(fill)
+
+async def keep_alive(client, listen_key):
+    """Extend the listenKey every LISTEN_KEY_KEEPALIVE seconds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(keepalive_interval)
+        try:
+            await loop.run_in_executor(None, lambda: client.futures_stream_keepalive(listenKey=listen_key))
+            logger.debug("Extended user data stream listenKey")
+        except Exception as e:
+            logger.warning(f"Error extending listenKey: {e}")
+
+async def stream_account(mirror, url=user_stream_url):
+    """Keep `mirror` in sync with the user data stream, reconciling over REST after each (re)connect."""
+    loop = asyncio.get_running_loop()
+    delay = reconnect_delay
+
+    while True:
+        keeper = syncer = None
+        try:
+            listen_key = await loop.run_in_executor(None, mirror.client.futures_stream_get_listen_key)
+            async with websockets.connect(f"{url}/{listen_key}") as websocket:
+                logger.info(f"Connected to the user data stream at {url}")
+                delay = reconnect_delay
+                keeper = asyncio.create_task(keep_alive(mirror.client, listen_key))
+
+                # Subscribed first, events arriving during the REST snapshot are applied right after it
+                pending = []
+
+                async def sync():
+                    await loop.run_in_executor(None, mirror.reconcile)
+                    # No await from here on, so no stream event can slip in between the buffered ones
+                    for buffered in pending:
+                        mirror.apply(buffered)
+                    pending.clear()
+                    mirror.synced = True
+                def close_on_failure(task):
+                    # A failed snapshot closes the socket, so the stream reconnects instead of buffering forever
+                    if not task.cancelled() and task.exception() is not None:
+                        asyncio.ensure_future(websocket.close())
+
+                syncer = asyncio.create_task(sync())
+                syncer.add_done_callback(close_on_failure)
+
+                async for message in websocket:
+                    event = json.loads(message)
+                    if event.get('e') == 'listenKeyExpired':
+                        logger.warning("User data stream listenKey expired, reconnecting")
+                        break
+                    if mirror.synced:
+                        mirror.apply(event)
+                    else:
+                        pending.append(event)
+
+                if syncer.done() and not syncer.cancelled() and syncer.exception() is not None:
+                    raise syncer.exception()
+        except (websockets.ConnectionClosed, OSError) as e:
+            logger.warning(f"User data stream disconnected: {e}. Reconnecting in {delay:.0f}s...")
+        except Exception as e:
+            logger.error(f"User data stream error: {e}. Reconnecting in {delay:.0f}s...", exc_info=True)
+        finally:
+            mirror.synced = False
+            for task in (keeper, syncer):
+                if task is not None:
+                    task.cancel()
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+
+_lock = threading.Lock()
+_mirror = None
+
+def get_mirror():
+    """Return the running AccountMirror, or None if start_mirror was never called."""
+    return _mirror
+
+def start_mirror(client=None, url=user_stream_url, on_fill=None, on_reconnect=None):
+    """Start the process-wide AccountMirror on a daemon thread and return it.
+
+    `on_fill` and `on_reconnect` are registered before the stream connects, so they see the first reconciliation.
+    """
+    global _mirror
+    with _lock:
+        if _mirror is None:
+            _mirror = AccountMirror(client)
+            if on_fill is not None:
+                _mirror.on_fill.append(on_fill)
+            if on_reconnect is not None:
+                _mirror.on_reconnect.append(on_reconnect)
+            threading.Thread(target=lambda: asyncio.run(stream_account(_mirror, url)), name='account-stream', daemon=True).start()
+        return _mirror
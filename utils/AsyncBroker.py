@@ -0,0 +1,316 @@
+import os
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode
+import aiohttp
+from yarl import URL
+from dotenv import load_dotenv
+from .SafeAPI import MAX_RETRIES, RETRY_DELAY
+from .ExchangeInfo import get_metadata
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/broker.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+use_testnet = os.getenv('USE_TESTNET') == 'True'
+
+# REST endpoint, overridable to point the broker at a local mock exchange
+rest_url = os.getenv('BINANCE_REST_URL') or ('https://testnet.binancefuture.com' if use_testnet else 'https://fapi.binance.com')
+
+# Connection Pool Setting
+pool_size = int(os.getenv('BROKER_POOL_SIZE', 10))
+keepalive_timeout = float(os.getenv('BROKER_KEEPALIVE', 60))
+request_timeout = float(os.getenv('BROKER_TIMEOUT', 10))
+recv_window = int(os.getenv('BROKER_RECV_WINDOW', 5000))
+
+# Binance accepts at most 5 orders per batchOrders request
+BATCH_SIZE = 5
+
+class BinanceRestError(Exception):
+    """Error response of the Binance REST API."""
+
+    def __init__(self, status, code, message):
+        super().__init__(f"HTTP {status} code {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+class OrderStatusUnknown(BinanceRestError):
+    """An order request was sent but no response came back, the exchange may or may not have placed it."""
+
+    def __init__(self, path, error):
+        super().__init__(None, None, f"No response to {path}: {error}")
+
+class AsyncRestClient:
+    """Signed Binance futures REST calls over one pooled keep-alive aiohttp session.
+
+    The session is opened on first use inside the running event loop and reuses its TCP/TLS connections,
+    so a request after the first costs one round trip.
+    """
+
+    def __init__(self, api_key, api_secret, base_url=rest_url, pool_size=pool_size):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.session = None
+
+    async def open(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=keepalive_timeout)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'X-MBX-APIKEY': self.api_key or ''},
+                timeout=aiohttp.ClientTimeout(total=request_timeout),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def sign(self, params):
+        """Return the query string of `params` with a timestamp and its HMAC-SHA256 signature."""
+        params = {**params, 'timestamp': int(time.time() * 1000), 'recvWindow': recv_window}
+        query = urlencode(params)
+        signature = hmac.new((self.api_secret or '').encode(), query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def request(self, method, path, params=None, signed=True, idempotent=True):
+        """Send one request and return its decoded JSON, retrying on rate limits and connection errors.
+
+        A request that isn't `idempotent` is only retried when it never left, a timeout or dropped
+        connection after sending raises OrderStatusUnknown instead.
+        """
+        session = await self.open()
+        for attempt in range(1, MAX_RETRIES + 1):
+            query = self.sign(params or {}) if signed else urlencode(params or {})
+            try:
+                # Sent as encoded, requoting the query would break its signature
+                async with session.request(method, URL(f"{self.base_url}{path}?{query}", encoded=True)) as response:
+                    text = await response.text()
+                    try:
+                        body = json.loads(text)
+                    except ValueError:
+                        raise BinanceRestError(response.status, None, text[:200])
+                    if response.status in (418, 429):
+                        delay = float(response.headers.get('Retry-After', RETRY_DELAY))
+                        logger.warning(f"Rate limited on {path}, retrying in {delay}s ({attempt}/{MAX_RETRIES})")
+                        await asyncio.sleep(delay)
+                        continue
+                    if response.status >= 400:
+                        raise BinanceRestError(response.status, body.get('code') if isinstance(body, dict) else None,
+                                               body.get('msg') if isinstance(body, dict) else text[:200])
+                    return body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not idempotent and not isinstance(e, aiohttp.ClientConnectorError):
+                    raise OrderStatusUnknown(path, e)
+                logger.warning(f"Connection error on {path}: {e} ({attempt}/{MAX_RETRIES})")
+                await asyncio.sleep(RETRY_DELAY)
+        raise BinanceRestError(None, None, f"{method} {path} failed after {MAX_RETRIES} attempts")
+
+def market_order(symbol, side, quantity, **extra):
+    """Order parameters of a market order, as accepted by /fapi/v1/order and /fapi/v1/batchOrders."""
+    return {'symbol': symbol, 'side': side, 'type': 'MARKET', 'quantity': f"{float(quantity):f}".rstrip('0').rstrip('.'), **extra}
+
+class AsyncBinanceBroker:
+    """BinanceBroker with an asyncio interface that sends the orders of a bar in batches.
+
+    buy() and sell() queue market orders and flush() posts the queue, one batchOrders request per five
+    orders with all requests in flight at once. A pyramiding entry therefore costs one round trip.
+    """
+
+    def __init__(self, client, symbol):
+        self.client = client
+        self.symbol = symbol
+        self.queue = []
+        # Every order gets its client id when queued, so a status lookup after a lost response can find it
+        self.id_prefix = f"gb{int(time.time() * 1000)}"
+        self.sequence = 0
+
+    def queue_order(self, side, quantity, last_price=None, **extra):
+        """Queue an order rounded to the symbol's filters, checked against them too when `last_price` is given."""
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid quantity {quantity!r}, quantity must be a number")
+            return False
+        if quantity <= 0:
+            logger.error(f"Invalid quantity {quantity}, quantity must be greater than 0")
+            return False
+        # batchOrders rejects the whole order when its quantity is off the lot step
+        metadata = get_metadata()
+        try:
+            if last_price is not None:
+                rounded = metadata.validate_order(self.symbol, quantity, last_price)
+            else:
+                rounded = metadata.round_quantity(self.symbol, quantity)
+        except ValueError as e:
+            logger.error(f"Order {side} {quantity} {self.symbol} rejected by the symbol filters: {e}")
+            return False
+        if rounded <= 0:
+            logger.error(f"Quantity {quantity} {self.symbol} rounds to 0 on the lot step")
+            return False
+        quantity = rounded
+        for key in ('price', 'stopPrice'):
+            if key in extra:
+                extra[key] = metadata.round_price(self.symbol, float(extra[key]))
+        self.sequence += 1
+        extra.setdefault('newClientOrderId', f"{self.id_prefix}-{self.sequence}")
+        self.queue.append(market_order(self.symbol, side, quantity, **extra))
+        return True
+
+    def buy(self, quantity, last_price=None, **extra):
+        return self.queue_order('BUY', quantity, last_price, **extra)
+
+    def sell(self, quantity, last_price=None, **extra):
+        return self.queue_order('SELL', quantity, last_price, **extra)
+
+    async def send_batch(self, orders):
+        """Post up to five orders once and return one result per order, an order dict or an error dict."""
+        if len(orders) == 1:
+            try:
+                return [await self.client.request('POST', '/fapi/v1/order', orders[0], idempotent=False)]
+            except OrderStatusUnknown:
+                raise
+            except BinanceRestError as e:
+                return [{'code': e.code, 'msg': e.message}]
+        return await self.client.request('POST', '/fapi/v1/batchOrders', {'batchOrders': json.dumps(orders, separators=(',', ':'))}, idempotent=False)
+
+    async def query_order(self, order):
+        """Return the exchange's copy of a queued order, looked up by its client id, or None if it was never placed."""
+        try:
+            return await self.client.request('GET', '/fapi/v1/order', {'symbol': self.symbol, 'origClientOrderId': order['newClientOrderId']})
+        except BinanceRestError as e:
+            # -2013: Order does not exist
+            if e.code == -2013:
+                return None
+            raise
+
+    async def post_batch(self, orders):
+        """Post up to five orders and return one result per order, an order dict or an error dict.
+
+        Orders are never posted twice: when the response is lost, each order is looked up by its client id
+        and only the ones the exchange doesn't know are sent again.
+        """
+        results = [None] * len(orders)
+        pending = list(range(len(orders)))
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                for index, result in zip(pending, await self.send_batch([orders[index] for index in pending])):
+                    results[index] = result
+                return results
+            except OrderStatusUnknown as e:
+                logger.warning(f"{e}, looking up {len(pending)} {self.symbol} orders before resending ({attempt}/{MAX_RETRIES})")
+            # Give the exchange time to finish placing what it received before asking for it
+            await asyncio.sleep(RETRY_DELAY)
+            placed = await asyncio.gather(*(self.query_order(orders[index]) for index in pending))
+            for index, result in zip(pending, placed):
+                results[index] = result
+            pending = [index for index, result in zip(pending, placed) if result is None]
+            if not pending:
+                return results
+        for index in pending:
+            results[index] = {'code': None, 'msg': f"Not placed after {MAX_RETRIES} attempts"}
+        return results
+
+    async def place_orders(self, orders):
+        """Post `orders` in batches of five, concurrently, and return the results in order."""
+        batches = [orders[i:i + BATCH_SIZE] for i in range(0, len(orders), BATCH_SIZE)]
+        results = []
+        for batch, outcome in zip(batches, await asyncio.gather(*(self.post_batch(batch) for batch in batches), return_exceptions=True)):
+            if isinstance(outcome, Exception):
+                logger.error(f"Error posting {len(batch)} {self.symbol} orders: {outcome}")
+                outcome = [{'code': getattr(outcome, 'code', None), 'msg': str(outcome)}] * len(batch)
+            results.extend(outcome)
+
+        for order, result in zip(orders, results):
+            if 'code' in result and 'orderId' not in result:
+                logger.error(f"Order {order['side']} {order['quantity']} {self.symbol} rejected: {result.get('msg')}")
+        return results
+
+    async def flush(self):
+        """Post every queued order and return their results."""
+        orders, self.queue = self.queue, []
+        if not orders:
+            return []
+        started = time.perf_counter()
+        results = await self.place_orders(orders)
+        logger.info(f"Posted {len(orders)} {self.symbol} orders in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return results
+
+    async def get_balance(self):
+        return await self.client.request('GET', '/fapi/v2/balance')
+
+    async def set_leverage(self, leverage):
+        allowed = get_metadata().max_leverage(self.symbol)
+        if leverage > allowed:
+            logger.warning(f"Leverage {leverage} above the {allowed} allowed on {self.symbol}, using {allowed}")
+            leverage = allowed
+        return await self.client.request('POST', '/fapi/v1/leverage', {'symbol': self.symbol, 'leverage': int(leverage)})
+
+    async def close(self):
+        await self.client.close()
+
+class BatchingBroker:
+    """Blocking front end of AsyncBinanceBroker for synchronous callers such as a strategy's next().
+
+    The event loop and its connection pool live in a daemon thread for the life of the broker.
+    """
+
+    def __init__(self, api_key, api_secret, symbol, base_url=rest_url):
+        self.symbol = symbol
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=f"broker-{symbol}", daemon=True)
+        self.thread.start()
+        self.broker = AsyncBinanceBroker(AsyncRestClient(api_key, api_secret, base_url), symbol)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def buy(self, quantity, last_price=None):
+        return self.broker.buy(quantity, last_price)
+
+    def sell(self, quantity, last_price=None):
+        return self.broker.sell(quantity, last_price)
+
+    def flush(self):
+        if not self.broker.queue:
+            return []
+        return self.run(self.broker.flush())
+
+    def get_balance_broker(self):
+        return self.run(self.broker.get_balance())
+
+    def set_leverage(self, leverage):
+        return self.run(self.broker.set_leverage(leverage))
+
+    def close(self):
+        self.run(self.broker.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from sqlalchemy import text
+from .Clients import get_client, get_engine
+from .CandleDB import create_database_and_table, insert_data_to_db, interval_step
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+symbol = os.getenv('SYMBOL')
+interval = os.getenv('INTERVAL')
+
+# Backfill Setting
+backfill_jobs = os.getenv('BACKFILL_JOBS', f"{symbol}:{interval}")  # e.g. BTCUSDT:1m,BTCUSDT:15m,ETHUSDT:4h
+backfill_workers = int(os.getenv('BACKFILL_WORKERS', 8))
+chunk_bars = int(os.getenv('BACKFILL_CHUNK_BARS', 50_000))  # Bars fetched by one worker task
+request_weight_limit = int(os.getenv('REQUEST_WEIGHT_LIMIT', 1200))  # Weight allowed per minute, shared by all workers
+klines_weight = int(os.getenv('KLINES_WEIGHT', 2))  # Weight of one klines request with limit=1000
+klines_limit = 1000
+
+def parse_jobs(jobs):
+    """Parse a 'SYMBOL:INTERVAL,...' string into a list of (symbol, interval) tuples."""
+    parsed = []
+    for job in jobs.split(','):
+        job = job.strip()
+        if not job:
+            continue
+        job_symbol, job_interval = job.split(':')
+        parsed.append((job_symbol.strip(), job_interval.strip()))
+    return parsed
+
+class WeightBudget:
+    """Token bucket shared by all workers so the backfill stays under the exchange request-weight limit."""
+
+    def __init__(self, weight_per_minute):
+        self.capacity = weight_per_minute
+        self.tokens = weight_per_minute
+        self.rate = weight_per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, weight):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+def job_start_time(symbol, interval, budget):
+    """Return the first open time to fetch for a job, resuming after the latest stored candle."""
+    with get_engine().connect() as connection:
+        result = connection.execute(text(f"SELECT MAX(timestamp) FROM {symbol}_{interval}_candles"))
+        latest_timestamp = result.fetchone()[0]
+
+    if latest_timestamp:
+        return int(latest_timestamp.timestamp() * 1000) + interval_step(interval)
+
+    budget.acquire(klines_weight)
+    return get_client()._get_earliest_valid_timestamp(symbol, interval)
+
+def split_chunks(start_time, end_time, step):
+    """Split [start_time, end_time) into ranges of chunk_bars bars."""
+    chunk_ms = chunk_bars * step
+    return [(chunk_start, min(chunk_start + chunk_ms, end_time)) for chunk_start in range(start_time, end_time, chunk_ms)]
+
+def fetch_chunk(symbol, interval, chunk_start, chunk_end, budget):
+    """Page through the klines of one chunk and write each page as a batch."""
+    step = interval_step(interval)
+    start_time = chunk_start
+    total = 0
+
+    while start_time < chunk_end:
+        budget.acquire(klines_weight)
+        candles = get_client().get_klines(symbol=symbol, interval=interval, startTime=start_time, endTime=chunk_end - 1, limit=klines_limit)
+        if not candles:
+            break
+
+        total += insert_data_to_db(candles, symbol, interval)
+        start_time = int(candles[-1][0]) + step
+
+    return total
+
+def run_backfill(jobs, workers=backfill_workers, weight_per_minute=request_weight_limit):
+    """Backfill every (symbol, interval) job concurrently and return the number of candles written per job."""
+    budget = WeightBudget(weight_per_minute)
+    end_time = int(time.time() * 1000)
+    totals = {job: 0 for job in jobs}
+
+    # Table creation shares the module connection of CandleDB, so keep it on this thread
+    for job_symbol, job_interval in jobs:
+        create_database_and_table(job_symbol, job_interval)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for job_symbol, job_interval in jobs:
+            step = interval_step(job_interval)
+            start_time = job_start_time(job_symbol, job_interval, budget)
+            # Stop at the open time of the current bar so only closed candles are stored
+            chunks = split_chunks(start_time, end_time - end_time % step, step)
+            logger.info(f"Backfilling {job_symbol} {job_interval} in {len(chunks)} chunks")
+            for chunk_start, chunk_end in chunks:
+                future = executor.submit(fetch_chunk, job_symbol, job_interval, chunk_start, chunk_end, budget)
+                futures[future] = (job_symbol, job_interval)
+
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                totals[job] += future.result()
+            except Exception as e:
+                logger.error(f"Error backfilling {job[0]} {job[1]}: {e}", exc_info=True)
+
+    elapsed = time.perf_counter() - started
+    for (job_symbol, job_interval), total in totals.items():
+        logger.info(f"Backfilled {total} candles for {job_symbol} {job_interval}")
+    logger.info(f"Backfill finished in {elapsed:.2f}s ({sum(totals.values()) / max(elapsed, 1e-9):.0f} rows/s)")
+    return totals
+
+if __name__ == "__main__":
+    run_backfill(parse_jobs(backfill_jobs))
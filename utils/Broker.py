@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 from binance_f import RequestClient
 from binance_f import RequestClient
 from binance_f.model import OrderSide, OrderType
+from .ExchangeInfo import get_metadata
 
 # Load environment variables
 load_dotenv()
@@ -47,7 +48,22 @@ class BinanceBroker:
         self.margin_type = margin_type
         self.set_leverage(leverage) 
 
-    def buy(self, quantity):
+    def order_quantity(self, quantity, price=None):
+        """Return `quantity` rounded to the symbol's lot step, or None if it breaks the symbol's filters at `price`."""
+        try:
+            if price is not None:
+                quantity = get_metadata().validate_order(self.symbol, quantity, price)
+            else:
+                quantity = get_metadata().round_quantity(self.symbol, quantity)
+        except ValueError as e:
+            print(f"Invalid quantity. {e}")
+            return None
+        if quantity <= 0:
+            print("Invalid quantity. Quantity rounds to 0 on the lot step.")
+            return None
+        return quantity
+
+    def buy(self, quantity, price=None):
         try:
             quantity = float(quantity)
         except ValueError:
@@ -58,6 +74,10 @@ class BinanceBroker:
             print("Invalid quantity. Quantity must be greater than 0.")
             return None
 
+        quantity = self.order_quantity(quantity, price)
+        if quantity is None:
+            return None
+
         try:
             order = self.client.post_order(symbol=self.symbol, side=OrderSide.BUY, ordertype=OrderType.MARKET, quantity=quantity)
             return order
@@ -65,7 +85,7 @@ class BinanceBroker:
             print(f"Error buying {quantity} {self.symbol}: {e}")
             return None
 
-    def sell(self, quantity):
+    def sell(self, quantity, price=None):
         try:
             quantity = float(quantity)
         except ValueError:
@@ -76,6 +96,10 @@ class BinanceBroker:
             print("Invalid quantity. Quantity must be greater than 0.")
             return None
 
+        quantity = self.order_quantity(quantity, price)
+        if quantity is None:
+            return None
+
         try:
             order = self.client.post_order(symbol=self.symbol, side=OrderSide.SELL, ordertype=OrderType.MARKET, quantity=quantity)
             return order
@@ -96,19 +120,16 @@ class BinanceBroker:
 
     def set_leverage(self, leverage):
         try:
+            # Capped to the highest leverage of the symbol's first notional bracket
+            leverage = min(leverage, get_metadata().max_leverage(self.symbol))
             self.client.change_initial_leverage(symbol=self.symbol, leverage=leverage)
         except Exception as e:
             print(f"Error setting leverage for {self.symbol}: {e}")
 
     def set_commission(self, maker_rate, taker_rate):
         try:
-            exchange_info = self.client.get_exchange_information()
-            symbol_filters = [s for s in exchange_info.symbols if s.symbol == self.symbol][0].filters
-            for f in symbol_filters:
-                if hasattr(f, 'filterType') and f.filterType == 'COMMISSION_RATE':
-                    maker_rate = float(f.makerCommissionRate)
-                    taker_rate = float(f.takerCommissionRate)
-                    break
+            # Cached per symbol instead of downloading the exchange info of every symbol
+            maker_rate, taker_rate = get_metadata().commission(self.symbol)
             self.client.change_trade_fee(symbol=self.symbol, makerCommission=maker_rate, takerCommission=taker_rate)
         except Exception as e:
             print(f"Error setting commission rate for {self.symbol}: {e}")
@@ -0,0 +1,236 @@
+import os
+import json
+import fcntl
+import logging
+from itertools import chain
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows converted to NumPy per round trip when loading candles
+load_chunk_size = int(os.getenv('LOAD_CHUNK_SIZE', 100_000))
+
+cache_dir = os.getenv('CANDLE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '../cache'))
+
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+def to_ms(date):
+    """Convert a date string, datetime or Timestamp to epoch milliseconds."""
+    return pd.Timestamp(date).value // 1_000_000
+
+class CandleArrays(namedtuple('CandleArrays', ['timestamp', 'ohlcv'])):
+    """Candle history as int64 open times in ms and a row-major (n, 5) float64 OHLCV block."""
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty((0, len(CANDLE_FIELDS)), dtype=np.float64))
+
+    @property
+    def open(self):
+        return self.ohlcv[:, 0]
+
+    @property
+    def high(self):
+        return self.ohlcv[:, 1]
+
+    @property
+    def low(self):
+        return self.ohlcv[:, 2]
+
+    @property
+    def close(self):
+        return self.ohlcv[:, 3]
+
+    @property
+    def volume(self):
+        return self.ohlcv[:, 4]
+
+    def between(self, start_date=None, end_date=None):
+        """Return a view of the bars with start_date <= timestamp <= end_date."""
+        start = 0 if start_date is None else np.searchsorted(self.timestamp, to_ms(start_date), side='left')
+        end = len(self.timestamp) if end_date is None else np.searchsorted(self.timestamp, to_ms(end_date), side='right')
+        return CandleArrays(self.timestamp[start:end], self.ohlcv[start:end])
+
+    def to_frame(self):
+        """Wrap the arrays in a DataFrame laid out for BinanceData without copying the OHLCV block."""
+        df = pd.DataFrame(self.ohlcv, columns=CANDLE_FIELDS, copy=False)
+        df.insert(0, 'timestamp', pd.to_datetime(self.timestamp, unit='ms'))
+        return df
+
+def time_conditions(start_date=None, end_date=None, after=None):
+    """Return the WHERE clause and bind params selecting candles by open time."""
+    conditions, params = [], {}
+    if start_date is not None:
+        conditions.append("timestamp >= :start_date")
+        params['start_date'] = pd.Timestamp(start_date).to_pydatetime()
+    if end_date is not None:
+        conditions.append("timestamp <= :end_date")
+        params['end_date'] = pd.Timestamp(end_date).to_pydatetime()
+    if after is not None:
+        conditions.append("timestamp > :after")
+        params['after'] = pd.Timestamp(after).to_pydatetime()
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+def epoch_ms(dialect):
+    """SQL expression of the open time in epoch ms; SQLite stands in for Postgres in the benchmarks."""
+    if dialect == 'sqlite':
+        return "ROUND((julianday(timestamp) - 2440587.5) * 86400000.0)"
+    return "EXTRACT(EPOCH FROM timestamp) * 1000"
+
+def candle_select(symbol, interval, where, *columns, dialect='postgresql'):
+    """SELECT of the open time in ms and the OHLCV columns cast to float64, after any leading `columns`."""
+    return f"""
+        SELECT {''.join(f'{column}, ' for column in columns)}CAST({epoch_ms(dialect)} AS DOUBLE PRECISION),
+               CAST(open_price AS DOUBLE PRECISION), CAST(high_price AS DOUBLE PRECISION), CAST(low_price AS DOUBLE PRECISION),
+               CAST(close_price AS DOUBLE PRECISION), CAST(volume AS DOUBLE PRECISION)
+        FROM {symbol}_{interval}_candles {where}
+    """
+
+def fetch_rows(engine, sql, params, width):
+    """Run `sql` through a server-side cursor and return its float64 rows as one (n, width) array."""
+    blocks = []
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=load_chunk_size).execute(text(sql), params)
+        for rows in result.partitions():
+            blocks.append(np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * width).reshape(-1, width))
+    return np.concatenate(blocks) if blocks else np.empty((0, width))
+
+def fetch_candle_arrays(engine, symbol, interval, start_date=None, end_date=None, after=None):
+    """Load candles in time order as CandleArrays, selecting only the OHLCV columns already cast to float64 in SQL.
+
+    Rows are pulled through a server-side cursor one chunk at a time and converted straight into NumPy,
+    so no Decimal objects or full-table row list are ever built.
+    """
+    where, params = time_conditions(start_date, end_date, after)
+    sql = candle_select(symbol, interval, where, dialect=engine.dialect.name) + "ORDER BY timestamp"
+    block = fetch_rows(engine, sql, params, len(CANDLE_FIELDS) + 1)
+    return CandleArrays(block[:, 0].astype(np.int64), np.ascontiguousarray(block[:, 1:]))
+
+def fetch_many_candle_arrays(engine, symbols, interval, start_date=None, end_date=None):
+    """Load the candles of several symbols in one round trip and return {symbol: CandleArrays}.
+
+    The per-symbol tables are combined with UNION ALL and ordered by symbol, then time, so each symbol's
+    bars are a contiguous slice of a single array.
+    """
+    where, params = time_conditions(start_date, end_date)
+    sql = " UNION ALL ".join(
+        candle_select(symbol, interval, where, f"CAST({index} AS DOUBLE PRECISION) AS symbol_index", dialect=engine.dialect.name)
+        for index, symbol in enumerate(symbols)
+    ) + " ORDER BY 1, 2"
+    block = fetch_rows(engine, sql, params, len(CANDLE_FIELDS) + 2)
+
+    bounds = np.searchsorted(block[:, 0], np.arange(len(symbols) + 1), side='left')
+    timestamp = block[:, 1].astype(np.int64)
+    ohlcv = np.ascontiguousarray(block[:, 2:])
+    return {
+        symbol: CandleArrays(timestamp[start:end], ohlcv[start:end])
+        for symbol, start, end in zip(symbols, bounds[:-1], bounds[1:])
+    }
+
+def append_file(path, size, array):
+    """Truncate a file to `size` bytes and append the raw bytes of an array."""
+    with open(path, 'ab') as f:
+        f.truncate(size)
+        f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+class CandleCache:
+    """Append-only on-disk copy of a candles table, read back through memory-mapped arrays.
+
+    Files live in {cache_dir}/{symbol}_{interval}/: timestamp.bin holds int64 open times, ohlcv.bin the
+    float64 rows and meta.json the committed row count, so a half-written append is never read.
+    """
+
+    def __init__(self, symbol, interval, root=cache_dir):
+        self.symbol = symbol
+        self.interval = interval
+        self.path = os.path.join(root, f"{symbol}_{interval}")
+        self.timestamp_path = os.path.join(self.path, 'timestamp.bin')
+        self.ohlcv_path = os.path.join(self.path, 'ohlcv.bin')
+        self.meta_path = os.path.join(self.path, 'meta.json')
+        self.lock_path = os.path.join(self.path, '.lock')
+        os.makedirs(self.path, exist_ok=True)
+
+    def rows(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)['rows']
+        except FileNotFoundError:
+            return 0
+
+    def load(self):
+        """Map the cached bars read-only; pages are shared by every process reading the same cache."""
+        rows = self.rows()
+        if rows == 0:
+            return CandleArrays.empty()
+        timestamp = np.memmap(self.timestamp_path, dtype=np.int64, mode='r', shape=(rows,))
+        ohlcv = np.memmap(self.ohlcv_path, dtype=np.float64, mode='r', shape=(rows, len(CANDLE_FIELDS)))
+        return CandleArrays(timestamp, ohlcv)
+
+    def clear(self):
+        """Drop the cached bars, e.g. after older rows were repaired in Postgres."""
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            for path in (self.meta_path, self.timestamp_path, self.ohlcv_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def high_water_mark(self):
+        """Return the open time in ms of the newest cached bar, or None when the cache is empty."""
+        rows = self.rows()
+        if rows == 0:
+            return None
+        return int(np.memmap(self.timestamp_path, dtype=np.int64, mode='r', shape=(rows,))[-1])
+
+    def append(self, arrays):
+        """Append bars newer than the high-water mark and return the number of bars written."""
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            rows = self.rows()
+            high_water_mark = self.high_water_mark()
+            if high_water_mark is not None:
+                arrays = arrays.between(pd.Timestamp(high_water_mark + 1, unit='ms'))
+            if len(arrays.timestamp) == 0:
+                return 0
+
+            # Drop anything past the committed row count left by an interrupted append
+            append_file(self.timestamp_path, rows * 8, arrays.timestamp.astype(np.int64))
+            append_file(self.ohlcv_path, rows * 8 * len(CANDLE_FIELDS), arrays.ohlcv.astype(np.float64))
+
+            with open(f"{self.meta_path}.tmp", 'w') as f:
+                json.dump({'rows': rows + len(arrays.timestamp), 'high_water_mark': int(arrays.timestamp[-1])}, f)
+            os.replace(f"{self.meta_path}.tmp", self.meta_path)
+            return len(arrays.timestamp)
+
+    def fetch_new(self, engine):
+        """Read the bars newer than the high-water mark from the candles table."""
+        high_water_mark = self.high_water_mark()
+        after = pd.Timestamp(high_water_mark, unit='ms') if high_water_mark is not None else None
+        return fetch_candle_arrays(engine, self.symbol, self.interval, after=after)
+
+    def update(self, engine):
+        """Append the rows newer than the high-water mark from Postgres and return the full cached history."""
+        appended = self.append(self.fetch_new(engine))
+        if appended:
+            logger.info(f"Appended {appended} candles to the {self.symbol} {self.interval} cache")
+        return self.load()
@@ -2,9 +2,11 @@ import logging
 import os
 import time
 from datetime import datetime
-from binance.client import Client
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, MetaData, Table, Column, Integer, String, DateTime, Numeric
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from .Clients import get_client, get_engine
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,98 +24,151 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-use_testnet = os.getenv('USE_TESTNET') == 'True'
-api_key = os.getenv('BINANCE_API_KEY')
-api_secret = os.getenv('BINANCE_API_SECRET')
 interval = os.getenv('INTERVAL')
 symbol = os.getenv('SYMBOL')
 
-if use_testnet:
-    client = Client(api_key, api_secret, testnet=True)
-else:
-    client = Client(api_key, api_secret)
+# Number of klines written per transaction
+batch_size = int(os.getenv('CANDLE_BATCH_SIZE', 5000))
+# Access method of the timestamp index: btree, or brin for very large append-only tables
+time_index = os.getenv('CANDLE_TIME_INDEX', 'btree')
 
-# Initialize SQL database
-db_uri = os.getenv('DB_URI_CANDLES')
-engine = create_engine(db_uri)
-conn = engine.connect()
+metadata = MetaData()
 
-def create_database_and_table():
+# Milliseconds per Binance interval unit, as in binance.helpers.interval_to_milliseconds
+interval_units = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+def interval_step(interval):
+    """Return the bar length of a Binance interval in milliseconds."""
+    try:
+        return int(interval[:-1]) * interval_units[interval[-1]]
+    except (TypeError, ValueError, KeyError):
+        raise ValueError(f"Unsupported interval: {interval}")
+
+def candles_table(symbol=symbol, interval=interval):
+    """Return the Table object for the {symbol}_{interval}_candles table."""
+    # Postgres folds the unquoted names used in raw SQL to lower case
+    name = f"{symbol}_{interval}_candles".lower()
+    if name in metadata.tables:
+        return metadata.tables[name]
+    return Table(name, metadata,
+        Column('id', Integer, primary_key=True),
+        Column('symbol', String(20), nullable=False),
+        Column('interval', String(20), nullable=False),
+        Column('timestamp', DateTime, nullable=False),
+        Column('open_price', Numeric(18, 8), nullable=False),
+        Column('high_price', Numeric(18, 8), nullable=False),
+        Column('low_price', Numeric(18, 8), nullable=False),
+        Column('close_price', Numeric(18, 8), nullable=False),
+        Column('volume', Numeric(18, 8), nullable=False)
+    )
+
+def candle_rows(candles, symbol=symbol, interval=interval):
+    """Convert raw Binance klines into rows for the candles table."""
+    return [{
+        "symbol": symbol,
+        "interval": interval,
+        "timestamp": datetime.fromtimestamp(candle[0] / 1000),
+        "open_price": float(candle[1]),
+        "high_price": float(candle[2]),
+        "low_price": float(candle[3]),
+        "close_price": float(candle[4]),
+        "volume": float(candle[5])
+    } for candle in candles]
+
+def insert_data_to_db(candles, symbol=symbol, interval=interval):
+    """Write klines in batches of one multi-row insert per transaction and return the number of rows written."""
+    table = candles_table(symbol, interval)
+    rows = candle_rows(candles, symbol, interval)
+    stmt = insert(table).on_conflict_do_nothing()
+    started = time.perf_counter()
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(stmt, batch)
+        except IntegrityError as e:
+            # Fall back to row-at-a-time so one bad kline does not drop the whole batch
+            logger.warning(f"Batch insert into {table.name} failed, retrying row by row: {e}")
+            for row in batch:
+                try:
+                    with get_engine().begin() as connection:
+                        connection.execute(stmt, row)
+                except IntegrityError as e:
+                    logger.error(f"Skipping candle {row['timestamp']} for {symbol} {interval}: {e}")
+
+    elapsed = time.perf_counter() - started
+    if rows:
+        logger.info(f"Inserted {len(rows)} candles into {table.name} in {elapsed:.2f}s ({len(rows) / max(elapsed, 1e-9):.0f} rows/s)")
+    return len(rows)
+
+def create_indexes(connection, symbol=symbol, interval=interval):
+    """Create the unique (symbol, interval, timestamp) key and the timestamp index of a candles table."""
+    table = f"{symbol}_{interval}_candles"
+    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_key ON {table} (symbol, interval, timestamp)"))
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_timestamp_idx ON {table} USING {time_index} (timestamp)"))
+
+def create_database_and_table(symbol=symbol, interval=interval):
     try:
-        result = conn.execute(text("SELECT datname FROM pg_catalog.pg_database WHERE datname = :db_name"), {'db_name': f"{symbol}_{interval}"})
-        exists = bool(result.fetchone())
-
-        # Create database if it doesn't exist
-        if not exists:
-            # End the current transaction
-            conn.execute(text("COMMIT"))
-            # Create the database with name symbol_interval
-            conn.execute(text(f"CREATE DATABASE {symbol}_{interval}"))
-
-        # Create candles table if it doesn't exist
-        result = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'candles')"))
-        exists = bool(result.fetchone()[0])
-
-        if not exists:
-            conn.execute(text(f"""
-                CREATE TABLE {symbol}_{interval}_candles (
-                    id SERIAL PRIMARY KEY,
-                    symbol VARCHAR(20) NOT NULL,
-                    interval VARCHAR(20) NOT NULL,
-                    timestamp TIMESTAMP NOT NULL,
-                    open_price NUMERIC(18, 8) NOT NULL,
-                    high_price NUMERIC(18, 8) NOT NULL,
-                    low_price NUMERIC(18, 8) NOT NULL,
-                    close_price NUMERIC(18, 8) NOT NULL,
-                    volume NUMERIC(18, 8) NOT NULL
-                )
-            """))
-
-            conn.execute(text("COMMIT"))
+        with get_engine().connect() as conn:
+            result = conn.execute(text("SELECT datname FROM pg_catalog.pg_database WHERE datname = :db_name"), {'db_name': f"{symbol}_{interval}"})
+            exists = bool(result.fetchone())
+
+            # Create database if it doesn't exist
+            if not exists:
+                # End the current transaction
+                conn.execute(text("COMMIT"))
+                # Create the database with name symbol_interval
+                conn.execute(text(f"CREATE DATABASE {symbol}_{interval}"))
+
+            # Create candles table if it doesn't exist
+            result = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = :table_name)"), {'table_name': f"{symbol}_{interval}_candles".lower()})
+            exists = bool(result.fetchone()[0])
+
+            if not exists:
+                conn.execute(text(f"""
+                    CREATE TABLE {symbol}_{interval}_candles (
+                        id SERIAL PRIMARY KEY,
+                        symbol VARCHAR(20) NOT NULL,
+                        interval VARCHAR(20) NOT NULL,
+                        timestamp TIMESTAMP NOT NULL,
+                        open_price NUMERIC(18, 8) NOT NULL,
+                        high_price NUMERIC(18, 8) NOT NULL,
+                        low_price NUMERIC(18, 8) NOT NULL,
+                        close_price NUMERIC(18, 8) NOT NULL,
+                        volume NUMERIC(18, 8) NOT NULL
+                    )
+                """))
+                create_indexes(conn, symbol, interval)
+
+                conn.execute(text("COMMIT"))
     except Exception as e:
-        logger.error("Error:", e)
-        
+        logger.error(f"Error creating candles table for {symbol} {interval}: {e}")
+
 def fetch_and_save_data():
-    result = conn.execute(text(f"SELECT MAX(timestamp) FROM {symbol}_{interval}_candles"))
-    latest_timestamp = result.fetchone()[0]
+    with get_engine().connect() as conn:
+        result = conn.execute(text(f"SELECT MAX(timestamp) FROM {symbol}_{interval}_candles"))
+        latest_timestamp = result.fetchone()[0]
 
     if latest_timestamp:
-        start_time = int(latest_timestamp.timestamp() * 1000) + 60_000
+        start_time = int(latest_timestamp.timestamp() * 1000) + interval_step(interval)
     else:
-        start_time = client._get_earliest_valid_timestamp(symbol, interval)
+        start_time = get_client()._get_earliest_valid_timestamp(symbol, interval)
 
     end_time = int(time.time() * 1000)
 
     while True:
-        candles = client.get_historical_klines(symbol, interval, start_time, end_time)
+        candles = get_client().get_historical_klines(symbol, interval, start_time, end_time)
 
         if not candles:
             logger.info("No new candles to fetch. Waiting for 1m before trying again...")
             time.sleep(60)
             continue
 
-        for candle in candles:
-            timestamp = datetime.fromtimestamp(candle[0] / 1000).strftime('%Y-%m-%d %H:%M:%S')
-            open_price = float(candle[1])
-            high_price = float(candle[2])
-            low_price = float(candle[3])
-            close_price = float(candle[4])
-            volume = float(candle[5])
-
-            conn.execute(text(f"INSERT INTO {symbol}_{interval}_candles (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume) VALUES (:symbol, :interval, :timestamp, :open_price, :high_price, :low_price, :close_price, :volume) ON CONFLICT DO NOTHING"), {
-                "symbol": symbol,
-                "interval": interval,
-                "timestamp": timestamp,
-                "open_price": open_price,
-                "high_price": high_price,
-                "low_price": low_price,
-                "close_price": close_price,
-                "volume": volume
-            })
-
-            conn.execute(text("COMMIT"))
-
-        start_time = int(candles[-1][0]) + 60_000
+        insert_data_to_db(candles)
+        timestamp = datetime.fromtimestamp(candles[-1][0] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+        start_time = int(candles[-1][0]) + interval_step(interval)
         logger.info(f"Downloaded {len(candles)} new candles. Last timestamp: {timestamp}")
 
         logger.debug("Waiting for 60 seconds before fetching the next batch of candles...")
@@ -0,0 +1,87 @@
+import os
+import json
+import asyncio
+import logging
+import websockets
+from dotenv import load_dotenv
+from .Backfill import parse_jobs, backfill_jobs, run_backfill
+from .CandleDB import insert_data_to_db
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+use_testnet = os.getenv('USE_TESTNET') == 'True'
+
+# Stream Setting
+stream_jobs = os.getenv('STREAM_JOBS', backfill_jobs)  # Same SYMBOL:INTERVAL format as BACKFILL_JOBS
+if use_testnet:
+    stream_url = os.getenv('STREAM_URL', 'wss://testnet.binance.vision/stream')
+else:
+    stream_url = os.getenv('STREAM_URL', 'wss://stream.binance.com:9443/stream')
+reconnect_delay = float(os.getenv('STREAM_RECONNECT_DELAY', 1))  # Initial delay in seconds, doubled up to 60s
+
+def stream_names(jobs):
+    """Return the Binance kline stream names for a list of (symbol, interval) jobs."""
+    return [f"{job_symbol.lower()}@kline_{job_interval}" for job_symbol, job_interval in jobs]
+
+def parse_kline(message):
+    """Return (symbol, interval, kline) for a closed kline message, or None while the candle is still open."""
+    data = json.loads(message)
+    data = data.get('data', data)
+    if data.get('e') != 'kline':
+        return None
+
+    k = data['k']
+    if not k['x']:
+        return None
+
+    # Same layout as a REST kline so it can go through insert_data_to_db
+    return k['s'], k['i'], [k['t'], k['o'], k['h'], k['l'], k['c'], k['v']]
+
+async def stream_candles(jobs, url=stream_url):
+    """Write closed candles for every job as they arrive, catching up over REST after each (re)connect."""
+    loop = asyncio.get_running_loop()
+    stream_uri = f"{url}?streams={'/'.join(stream_names(jobs))}"
+    delay = reconnect_delay
+
+    while True:
+        try:
+            async with websockets.connect(stream_uri) as websocket:
+                logger.info(f"Connected to {url} for {len(jobs)} kline streams")
+                delay = reconnect_delay
+
+                # Subscribed first, so candles closing during the catch-up are not missed
+                catch_up = loop.run_in_executor(None, run_backfill, jobs)
+
+                async for message in websocket:
+                    kline = parse_kline(message)
+                    if kline is None:
+                        continue
+                    kline_symbol, kline_interval, candle = kline
+                    await loop.run_in_executor(None, insert_data_to_db, [candle], kline_symbol, kline_interval)
+                    logger.debug(f"Stored closed {kline_symbol} {kline_interval} candle {candle[0]}")
+
+                await catch_up
+        except (websockets.ConnectionClosed, OSError) as e:
+            logger.warning(f"Kline stream disconnected: {e}. Reconnecting in {delay:.0f}s...")
+        except Exception as e:
+            logger.error(f"Kline stream error: {e}. Reconnecting in {delay:.0f}s...", exc_info=True)
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+
+if __name__ == "__main__":
+    asyncio.run(stream_candles(parse_jobs(stream_jobs)))
@@ -0,0 +1,61 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Binance Setting
+api_key = os.getenv('BINANCE_API_KEY')
+api_secret = os.getenv('BINANCE_API_SECRET')
+api_testnet_key = os.getenv('BINANCE_TESTNET_KEY')
+api_testnet_secret = os.getenv('BINANCE_TESTNET_SECRET')
+use_testnet = os.getenv('USE_TESTNET') == 'True'
+
+# Offline mode: no exchange or database connection is ever opened, backtests read the local candle cache
+offline = os.getenv('OFFLINE') == 'True'
+
+# Shared clients, created on first use or injected with set_client/set_engine
+_lock = threading.Lock()
+_client = None
+_engines = {}
+
+def get_client():
+    """Return the shared Binance client, creating it on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            if offline:
+                raise RuntimeError("Binance client requested in offline mode")
+            # Imported here so processes that never trade don't load the exchange client at all
+            from binance.client import Client
+            if use_testnet:
+                _client = Client(api_testnet_key, api_testnet_secret, testnet=True)
+            else:
+                _client = Client(api_key, api_secret)
+            logger.info(f"Created Binance {'testnet' if use_testnet else 'production'} client")
+        return _client
+
+def set_client(client):
+    """Use `client` as the shared Binance client, e.g. a mock in tests or an already connected client."""
+    global _client
+    with _lock:
+        _client = client
+
+def get_engine(uri_env='DB_URI_CANDLES'):
+    """Return the shared engine of the database whose URI is in the `uri_env` env var, creating it on first use."""
+    with _lock:
+        if uri_env not in _engines:
+            if offline:
+                raise RuntimeError(f"Database engine for {uri_env} requested in offline mode")
+            from sqlalchemy import create_engine
+            _engines[uri_env] = create_engine(os.getenv(uri_env))
+        return _engines[uri_env]
+
+def set_engine(engine, uri_env='DB_URI_CANDLES'):
+    """Use `engine` for the database whose URI is in the `uri_env` env var."""
+    with _lock:
+        _engines[uri_env] = engine
@@ -1,26 +1,16 @@
 import os
 import logging
 import time
-from sqlalchemy import create_engine, Table, Column, Integer, String, Float, MetaData, text, BigInteger
-from binance.client import Client
+import threading
+from sqlalchemy import Table, Column, Integer, String, Float, MetaData, text, BigInteger
 from dotenv import load_dotenv
+from .Clients import get_client, get_engine
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Binance client
-api_key = os.getenv('BINANCE_API_KEY')
-api_secret = os.getenv('BINANCE_API_SECRET')
-api_testnet_key = os.getenv('BINANCE_TESTNET_KEY')
-api_testnet_secret = os.getenv('BINANCE_TESTNET_SECRET')
-use_testnet = os.getenv('USE_TESTNET') == 'True'
 symbol = os.getenv('SYMBOL')
 
-if use_testnet:
-    client = Client(api_testnet_key, api_testnet_secret, testnet=True)
-else:
-    client = Client(api_key, api_secret)
-
 # Configure logging
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataBase.log')
 logging.basicConfig(
@@ -34,23 +24,6 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Initialize SQL database
-db_uri = os.getenv('DB_URI_TRADE')
-engine = create_engine(db_uri)
-
-# Check if database exists
-conn = engine.connect()
-result = conn.execute(text("SELECT datname FROM pg_catalog.pg_database WHERE datname = 'tradingdb'"))
-exists = bool(result.fetchone())
-
-# Create database if it doesn't exist
-if not exists:
-    conn.execute("CREATE DATABASE tradingdb")
-
-# Commit the transaction
-conn.execute(text("commit"))
-
-
 metadata = MetaData()
 
 trades = Table('trades', metadata,
@@ -63,7 +36,25 @@ trades = Table('trades', metadata,
     Column('time', BigInteger)
 )
 
-metadata.create_all(engine)
+def setup_database(engine=None):
+    """Create the trading database and the trades table if they don't exist and return the engine."""
+    engine = engine or get_engine('DB_URI_TRADE')
+    with engine.connect() as conn:
+        # Check if database exists
+        result = conn.execute(text("SELECT datname FROM pg_catalog.pg_database WHERE datname = 'tradingdb'"))
+        exists = bool(result.fetchone())
+
+        # Create database if it doesn't exist
+        if not exists:
+            # End the current transaction
+            conn.execute(text("COMMIT"))
+            conn.execute(text("CREATE DATABASE tradingdb"))
+
+        # Commit the transaction
+        conn.execute(text("commit"))
+
+    metadata.create_all(engine)
+    return engine
 
 def insert_trade(conn, symbol, trade):
     try:
@@ -89,32 +80,60 @@ def insert_trade(conn, symbol, trade):
         logging.error(f"Error inserting trade: {e}")
 
 
+def fetch_new_trades(conn, symbol, latest_trade_id):
+    """Insert the account trades of `symbol` after `latest_trade_id` over REST and return the latest trade id."""
+    fetched_trades = []
+    from_id = latest_trade_id + 1  # Only fetch trades with ID greater than the latest trade ID
+    limit = 1000
+    while True:
+        temp_trades = get_client().futures_account_trades(symbol=symbol, fromId=from_id, limit=limit)
+        if not temp_trades:
+            break
+        fetched_trades += temp_trades
+        from_id = fetched_trades[-1]['id'] + 1
+
+    if fetched_trades:
+        # Insert the new trades into the SQL database
+        new_trades = [trade for trade in fetched_trades if trade['id'] > latest_trade_id]
+        for trade in new_trades:
+            insert_trade(conn, symbol, trade)
+        conn.commit()
+        latest_trade_id = new_trades[-1]['id']
+    else:
+        logging.warning("No trades found")
+    return latest_trade_id
+
+def fill_trade(fill):
+    """Turn an AccountStream Fill into the REST account trade layout insert_trade expects."""
+    return {'id': fill.trade_id, 'price': fill.price, 'qty': fill.quantity, 'time': fill.time,
+            'buyer': fill.side == 'BUY', 'commission': fill.commission}
+
 if __name__ == '__main__':
+    from .AccountStream import start_mirror
+    # The trades table must exist before the first fill or REST catch-up is inserted
+    conn = setup_database().connect()
     latest_trade_id = 0
+    lock = threading.Lock()
+
+    def on_fill(fill):
+        global latest_trade_id
+        if fill.symbol != symbol:
+            return
+        with lock:
+            insert_trade(conn, symbol, fill_trade(fill))
+            conn.commit()
+            latest_trade_id = max(latest_trade_id, fill.trade_id)
+
+    def on_reconnect(mirror):
+        # Trades made while the stream was down only show up over REST
+        global latest_trade_id
+        with lock:
+            try:
+                latest_trade_id = fetch_new_trades(conn, symbol, latest_trade_id)
+            except Exception as e:
+                logging.error(f"Error: {e}")
+
+    # Fills arrive from the user data stream, REST is only polled after each (re)connect
+    start_mirror(on_fill=on_fill, on_reconnect=on_reconnect)
     while True:
-        try:
-            # Get trades for BTCUSDT futures
-            fetched_trades = []
-            from_id = latest_trade_id + 1  # Only fetch trades with ID greater than the latest trade ID
-            limit = 1000
-            while True:
-                temp_trades = client.futures_account_trades(symbol=symbol, fromId=from_id, limit=limit)
-                if not temp_trades:
-                    break
-                fetched_trades += temp_trades
-                from_id = fetched_trades[-1]['id'] + 1
-
-            if fetched_trades:
-                # Insert the new trades into the SQL database
-                new_trades = [trade for trade in fetched_trades if trade['id'] > latest_trade_id]
-                for trade in new_trades:
-                    insert_trade(conn, symbol, trade)
-                latest_trade_id = new_trades[-1]['id']
-
-            else:
-                logging.warning("No trades found")
-
-            time.sleep(300)
-
-        except Exception as e:
-            logging.error(f"Error: {e}")
\ No newline at end of file
+        time.sleep(60)
\ No newline at end of file
@@ -1,10 +1,16 @@
 import os
+import time
+import queue
 import logging
+import threading
 from datetime import datetime
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import backtrader as bt
 from dotenv import load_dotenv
+from .Clients import get_engine, offline
+from .CandleCache import CandleCache, fetch_candle_arrays, fetch_many_candle_arrays
+from .Resample import base_interval, resampled_cache, update_resampled
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,9 +35,17 @@ symbol = os.getenv('SYMBOL')
 start_date = os.getenv('START_DATE')
 end_date = os.getenv('END_DATE')
 
-# Initialize SQL database
-db_uri = os.getenv('DB_URI_CANDLES')
-engine = create_engine(db_uri)
+# Read candles from the local cache, refreshed from the database, when enabled
+use_cache = os.getenv('CANDLE_CACHE') == 'True'
+
+# Derive higher timeframes from the BASE_INTERVAL table instead of reading their own tables
+resample_from_base = os.getenv('RESAMPLE_FROM_BASE') == 'True'
+
+# Rows fetched per round trip by the server-side cursor of BinanceStreamData
+stream_chunk_size = int(os.getenv('STREAM_CHUNK_SIZE', 10000))
+
+# Seconds between checks for newly closed candles in live mode
+live_poll_seconds = float(os.getenv('LIVE_POLL_SECONDS', 1))
 
 class BinanceData(bt.feeds.PandasData):
     """Custom Data Feed for Binance data."""
@@ -49,17 +63,182 @@ class BinanceData(bt.feeds.PandasData):
     )
 
     @classmethod
-    def from_database(cls, symbol, interval, start_date, end_date, limit=10000):
-        """Fetch Binance data from the database and return a DataFrame."""
+    def from_cache(cls, symbol, interval, start_date, end_date):
+        """Append new rows from the database to the local cache and return the requested range as a DataFrame."""
+        arrays = CandleCache(symbol, interval).update(get_engine()).between(start_date, end_date)
+        return arrays.to_frame()
+
+    @classmethod
+    def from_resampled(cls, symbol, interval, start_date, end_date):
+        """Aggregate the base interval candles into `interval` candles and return the requested range as a DataFrame."""
+        arrays = update_resampled(get_engine(), symbol, interval).between(start_date, end_date)
+        return arrays.to_frame()
+
+    @classmethod
+    def load_arrays(cls, symbol, interval, start_date, end_date, limit=None):
+        """Fetch Binance data as CandleArrays, keeping only the latest `limit` candles if set.
+
+        In offline mode the local cache is read as it is, without asking the database for newer rows.
+        """
+        try:
+            started = time.perf_counter()
+            resampled = resample_from_base and interval != base_interval
+            if offline:
+                cache = resampled_cache(symbol, interval) if resampled else CandleCache(symbol, interval)
+                arrays = cache.load().between(start_date, end_date)
+            elif resampled:
+                arrays = update_resampled(get_engine(), symbol, interval).between(start_date, end_date)
+            elif use_cache:
+                arrays = CandleCache(symbol, interval).update(get_engine()).between(start_date, end_date)
+            else:
+                arrays = fetch_candle_arrays(get_engine(), symbol, interval, start_date, end_date)
+            if limit is not None:
+                arrays = arrays._replace(timestamp=arrays.timestamp[-limit:], ohlcv=arrays.ohlcv[-limit:])
+            logger.info(f"Loaded {len(arrays.timestamp)} {symbol} {interval} candles in {time.perf_counter() - started:.2f}s")
+            return arrays
+        except Exception as e:
+            logger.error(f"Error fetching data from the database: {e}")
+            raise
+
+    @classmethod
+    def load_many(cls, symbols, interval, start_date, end_date):
+        """Fetch several symbols' candles as {symbol: CandleArrays}, in a single query when reading the database."""
+        if offline or use_cache or (resample_from_base and interval != base_interval):
+            return {symbol: cls.load_arrays(symbol, interval, start_date, end_date) for symbol in symbols}
         try:
-            sql = text(f"SELECT * FROM {symbol}_{interval}_candles WHERE timestamp >= '{start_date}' AND timestamp <= '{end_date}' ORDER BY timestamp DESC LIMIT {limit}")
-            with engine.connect() as connection:
-                df = pd.read_sql_query(sql, connection)
-            return df
+            started = time.perf_counter()
+            arrays = fetch_many_candle_arrays(get_engine(), symbols, interval, start_date, end_date)
+            logger.info(f"Loaded {sum(len(a.timestamp) for a in arrays.values())} {interval} candles of {len(symbols)} symbols in {time.perf_counter() - started:.2f}s")
+            return arrays
         except Exception as e:
             logger.error(f"Error fetching data from the database: {e}")
             raise
 
+    @classmethod
+    def from_database(cls, symbol, interval, start_date, end_date, limit=None):
+        """Fetch Binance data from the database and return a DataFrame, keeping only the latest `limit` candles if set."""
+        return cls.load_arrays(symbol, interval, start_date, end_date, limit).to_frame()
+
+class BinanceStreamData(bt.feed.DataBase):
+    """Data feed streaming candles in time order through a server-side cursor.
+
+    Only one chunk of rows is held at a time and the first bar is delivered as soon as the first chunk
+    arrives. Run Cerebro with exactbars=1 so the line buffers stay flat as well.
+    """
+    params = (
+        ('symbol', symbol),
+        ('interval', interval),
+        ('start_date', start_date),
+        ('end_date', end_date),
+        ('chunk_size', stream_chunk_size),
+    )
+
+    def start(self):
+        super(BinanceStreamData, self).start()
+        sql = text(f"""
+            SELECT timestamp, CAST(open_price AS DOUBLE PRECISION), CAST(high_price AS DOUBLE PRECISION),
+                   CAST(low_price AS DOUBLE PRECISION), CAST(close_price AS DOUBLE PRECISION), CAST(volume AS DOUBLE PRECISION)
+            FROM {self.p.symbol}_{self.p.interval}_candles
+            WHERE timestamp >= :start_date AND timestamp <= :end_date
+            ORDER BY timestamp
+        """)
+        self.connection = get_engine().connect().execution_options(yield_per=self.p.chunk_size)
+        self.result = self.connection.execute(sql, {'start_date': self.p.start_date, 'end_date': self.p.end_date})
+        self.rows = iter(())
+
+    def stop(self):
+        self.result.close()
+        self.connection.close()
+
+    def _load(self):
+        row = next(self.rows, None)
+        if row is None:
+            chunk = self.result.fetchmany(self.p.chunk_size)
+            if not chunk:
+                return False
+            self.rows = iter(chunk)
+            row = next(self.rows)
+
+        timestamp, open_price, high_price, low_price, close_price, volume = row
+        self.lines.datetime[0] = bt.date2num(timestamp)
+        self.lines.open[0] = open_price
+        self.lines.high[0] = high_price
+        self.lines.low[0] = low_price
+        self.lines.close[0] = close_price
+        self.lines.volume[0] = volume
+        self.lines.openinterest[0] = 0.0
+        return True
+
+class BinanceLiveData(bt.feed.DataBase):
+    """Live data feed for one long-running Cerebro.
+
+    History from start_date is replayed first, then a background thread polls the candles table, kept
+    current by CandleStream, and only the newly closed candles are pushed to the strategy.
+    """
+    params = (
+        ('symbol', symbol),
+        ('interval', interval),
+        ('start_date', start_date),
+        ('poll_interval', live_poll_seconds),
+        ('qcheck', 0.5),  # Seconds Cerebro waits on the feed before checking again
+    )
+
+    def islive(self):
+        return True
+
+    def haslivedata(self):
+        return not self.candles.empty()
+
+    def start(self):
+        super(BinanceLiveData, self).start()
+        self.history = fetch_candle_arrays(get_engine(), self.p.symbol, self.p.interval, start_date=self.p.start_date)
+        self.history_index = 0
+        self.last_timestamp = int(self.history.timestamp[-1]) if len(self.history.timestamp) else None
+        self.candles = queue.Queue()
+        self.stopped = threading.Event()
+        self.poller = threading.Thread(target=self._poll, daemon=True)
+        self.poller.start()
+        self.put_notification(self.DELAYED)
+
+    def stop(self):
+        self.stopped.set()
+        self.poller.join()
+
+    def _poll(self):
+        while not self.stopped.is_set():
+            try:
+                after = pd.Timestamp(self.last_timestamp, unit='ms') if self.last_timestamp is not None else self.p.start_date
+                arrays = fetch_candle_arrays(get_engine(), self.p.symbol, self.p.interval, after=after)
+                for timestamp, candle in zip(arrays.timestamp, arrays.ohlcv):
+                    self.candles.put((int(timestamp), candle))
+                    self.last_timestamp = int(timestamp)
+            except Exception as e:
+                logger.error(f"Error polling {self.p.symbol} {self.p.interval} candles: {e}")
+            self.stopped.wait(self.p.poll_interval)
+
+    def _load(self):
+        if self.history_index < len(self.history.timestamp):
+            timestamp = int(self.history.timestamp[self.history_index])
+            candle = self.history.ohlcv[self.history_index]
+            self.history_index += 1
+        else:
+            # The last replayed bar stays DELAYED too, a restart must not act on it a second time
+            self.put_notification(self.LIVE)
+            try:
+                timestamp, candle = self.candles.get(timeout=self._qcheck)
+            except queue.Empty:
+                # No closed candle yet, Cerebro will ask again
+                return None
+
+        self.lines.datetime[0] = bt.date2num(datetime.utcfromtimestamp(timestamp / 1000))
+        self.lines.open[0] = candle[0]
+        self.lines.high[0] = candle[1]
+        self.lines.low[0] = candle[2]
+        self.lines.close[0] = candle[3]
+        self.lines.volume[0] = candle[4]
+        self.lines.openinterest[0] = 0.0
+        return True
+
 if __name__ == '__main__':
     try:
         symbol = os.getenv('SYMBOL')
@@ -0,0 +1,217 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import namedtuple
+from dotenv import load_dotenv
+from .Clients import get_client
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/broker.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Metadata Cache Setting, lifetimes in seconds
+exchange_info_ttl = float(os.getenv('EXCHANGE_INFO_TTL', 3600))
+commission_ttl = float(os.getenv('COMMISSION_TTL', 86400))
+leverage_bracket_ttl = float(os.getenv('LEVERAGE_BRACKET_TTL', 3600))
+balance_ttl = float(os.getenv('BALANCE_TTL', 5))
+
+SymbolFilters = namedtuple('SymbolFilters', [
+    'symbol', 'tick_size', 'min_price', 'max_price', 'step_size', 'min_qty', 'max_qty', 'min_notional',
+    'price_precision', 'quantity_precision',
+])
+
+class TTLCache:
+    """Dict of values that expire `ttl` seconds after they were loaded.
+
+    An expired value is still returned while a background thread reloads it, so only the very first
+    lookup of a key waits for its loader.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # key: (expires, value)
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        entry = self.entries.get(key)
+        if entry is None:
+            return self.load(key, loader)
+        expires, value = entry
+        if time.monotonic() >= expires:
+            with self.lock:
+                start = key not in self.refreshing
+                self.refreshing.add(key)
+            if start:
+                threading.Thread(target=self.refresh, args=(key, loader), daemon=True).start()
+        return value
+
+    def load(self, key, loader):
+        value = loader()
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def refresh(self, key, loader):
+        try:
+            self.load(key, loader)
+        except Exception as e:
+            # Keep serving the stale value, the next lookup tries again
+            logger.warning(f"Error refreshing cached {key}: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+def parse_filters(info):
+    """Build the SymbolFilters of one exchangeInfo symbol entry."""
+    filters = {f['filterType']: f for f in info.get('filters', [])}
+    price = filters.get('PRICE_FILTER', {})
+    lot = filters.get('LOT_SIZE', {})
+    notional = filters.get('MIN_NOTIONAL', {})
+    return SymbolFilters(
+        symbol=info['symbol'],
+        tick_size=float(price.get('tickSize', 0)),
+        min_price=float(price.get('minPrice', 0)),
+        max_price=float(price.get('maxPrice', 0)),
+        step_size=float(lot.get('stepSize', 0)),
+        min_qty=float(lot.get('minQty', 0)),
+        max_qty=float(lot.get('maxQty', 0)),
+        min_notional=float(notional.get('notional', notional.get('minNotional', 0))),
+        price_precision=int(info.get('pricePrecision', 8)),
+        quantity_precision=int(info.get('quantityPrecision', 8)),
+    )
+
+def round_step(value, step, precision):
+    """Round `value` down to a multiple of `step`, 0 meaning no step."""
+    if step <= 0:
+        return round(value, precision)
+    return round(math.floor(value / step + 1e-9) * step, precision)
+
+class ExchangeMetadata:
+    """Process-wide cache of exchange info, symbol filters, commission rates, leverage brackets and balances.
+
+    Exchange info is downloaded once per TTL and indexed by symbol, so a filter lookup is one dict access.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self.exchange_info = TTLCache(exchange_info_ttl)
+        self.commissions = TTLCache(commission_ttl)
+        self.leverage_brackets = TTLCache(leverage_bracket_ttl)
+        self.balances = TTLCache(balance_ttl)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    def load_symbols(self):
+        started = time.perf_counter()
+        info = self.client.futures_exchange_info()
+        symbols = {entry['symbol']: parse_filters(entry) for entry in info['symbols']}
+        logger.info(f"Loaded exchange info of {len(symbols)} symbols in {time.perf_counter() - started:.2f}s")
+        return symbols
+
+    def symbols(self):
+        """Return {symbol: SymbolFilters} of every futures symbol."""
+        return self.exchange_info.get('symbols', self.load_symbols)
+
+    def filters(self, symbol):
+        """Return the SymbolFilters of `symbol`."""
+        try:
+            return self.symbols()[symbol]
+        except KeyError:
+            raise ValueError(f"Unknown futures symbol: {symbol}")
+
+    def commission(self, symbol):
+        """Return the account's (maker, taker) commission rates on `symbol`."""
+        def load():
+            rate = self.client.futures_commission_rate(symbol=symbol)
+            return float(rate['makerCommissionRate']), float(rate['takerCommissionRate'])
+        return self.commissions.get(symbol, load)
+
+    def leverage_bracket(self, symbol):
+        """Return the notional brackets of `symbol` with their max leverage and maintenance margin ratio."""
+        def load():
+            brackets = self.client.futures_leverage_bracket(symbol=symbol)
+            # A symbol filter returns a dict on some API versions and a one element list on others
+            entry = brackets[0] if isinstance(brackets, list) else brackets
+            return entry['brackets']
+        return self.leverage_brackets.get(symbol, load)
+
+    def max_leverage(self, symbol, notional=0.0):
+        """Return the highest leverage allowed for a position of `notional` on `symbol`."""
+        for bracket in self.leverage_bracket(symbol):
+            if notional < float(bracket['notionalCap']):
+                return int(bracket['initialLeverage'])
+        return 1
+
+    def balance(self, asset='USDT'):
+        """Return the futures wallet balance of `asset`, at most BALANCE_TTL seconds old."""
+        def load():
+            return {entry['asset']: float(entry['balance']) for entry in self.client.futures_account_balance()}
+        return self.balances.get('balances', load).get(asset, 0.0)
+
+    def round_quantity(self, symbol, quantity):
+        """Round `quantity` down to the lot step of `symbol`."""
+        filters = self.filters(symbol)
+        return round_step(quantity, filters.step_size, filters.quantity_precision)
+
+    def round_price(self, symbol, price):
+        """Round `price` down to the tick size of `symbol`."""
+        filters = self.filters(symbol)
+        return round_step(price, filters.tick_size, filters.price_precision)
+
+    def validate_order(self, symbol, quantity, price):
+        """Return the quantity rounded to the lot step, or raise ValueError if it breaks the symbol's filters."""
+        filters = self.filters(symbol)
+        quantity = round_step(quantity, filters.step_size, filters.quantity_precision)
+        if quantity < filters.min_qty or (filters.max_qty and quantity > filters.max_qty):
+            raise ValueError(f"{symbol} quantity {quantity} outside [{filters.min_qty}, {filters.max_qty}]")
+        if quantity * price < filters.min_notional:
+            raise ValueError(f"{symbol} order notional {quantity * price:.2f} below {filters.min_notional}")
+        return quantity
+
+    def warm(self, symbols):
+        """Load the exchange info, commission rates and leverage brackets of `symbols` ahead of trading."""
+        self.symbols()
+        for symbol in symbols:
+            self.commission(symbol)
+            self.leverage_bracket(symbol)
+
+_lock = threading.Lock()
+_metadata = None
+
+def get_metadata():
+    """Return the process-wide ExchangeMetadata, creating it on first use."""
+    global _metadata
+    with _lock:
+        if _metadata is None:
+            _metadata = ExchangeMetadata()
+        return _metadata
+
+def set_metadata(metadata):
+    """Use `metadata` as the process-wide ExchangeMetadata, e.g. one built on a mock client."""
+    global _metadata
+    with _lock:
+        _metadata = metadata
@@ -0,0 +1,140 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from sqlalchemy import text
+from .Clients import get_engine
+from .CandleDB import interval_step
+from .CandleCache import CandleCache
+from .Backfill import WeightBudget, fetch_chunk, parse_jobs, backfill_jobs, backfill_workers, request_weight_limit
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def scan_gaps(symbol, interval, connection=None):
+    """Find missing and duplicate bars in one ordered pass over the candles table.
+
+    Returns (gaps, duplicates, misaligned) where gaps are (first_missing_ms, next_present_ms) ranges,
+    duplicates are timestamps stored more than once and misaligned are bars closer than one interval apart.
+    Pass `connection` to scan inside an open transaction.
+    """
+    step = interval_step(interval)
+    # Each bar is compared with the next one, so only the rows that break the expected step come back
+    sql = text(f"""
+        SELECT timestamp, next_timestamp FROM (
+            SELECT timestamp, LEAD(timestamp) OVER (ORDER BY timestamp) AS next_timestamp
+            FROM {symbol}_{interval}_candles
+        ) bars
+        WHERE next_timestamp <> timestamp + CAST(:step AS BIGINT) * INTERVAL '1 millisecond'
+    """)
+    if connection is None:
+        with get_engine().connect() as connection:
+            rows = connection.execute(sql, {'step': step}).fetchall()
+    else:
+        rows = connection.execute(sql, {'step': step}).fetchall()
+
+    gaps, duplicates, misaligned = [], [], []
+    for timestamp, next_timestamp in rows:
+        start, end = int(timestamp.timestamp() * 1000), int(next_timestamp.timestamp() * 1000)
+        # Rows come back in timestamp order, so the next bar is never earlier than this one
+        if end == start:
+            duplicates.append(timestamp)
+        elif end - start < step:
+            misaligned.append(next_timestamp)
+        else:
+            gaps.append((start + step, end))
+
+    missing = sum((end - start) // step for start, end in gaps)
+    logger.info(f"Scanned {symbol} {interval}: {len(gaps)} gaps ({missing} missing bars), {len(duplicates)} duplicates, {len(misaligned)} misaligned bars")
+    return gaps, duplicates, misaligned
+
+def check_scan(interval='1m'):
+    """Scan a throwaway table holding one gap, one duplicate and one misaligned bar and check each is found.
+
+    Returns True when scan_gaps classifies every planted bar correctly. The table only lives in the
+    transaction, which is rolled back.
+    """
+    step = interval_step(interval)
+    origin = datetime(2020, 1, 1)
+    # Bars 3 and 4 are missing, bar 6 is stored twice and one bar sits a third of a step after bar 8,
+    # which also leaves bar 9 less than a step after its predecessor
+    offsets = [0, 1, 2, 5, 6, 6, 7, 8, 8 + 1 / 3, 9]
+    bars = [{'timestamp': origin + timedelta(milliseconds=offset * step)} for offset in offsets]
+    origin_ms = int(origin.timestamp() * 1000)
+    expected = (
+        [(origin_ms + 3 * step, origin_ms + 5 * step)],
+        [origin + timedelta(milliseconds=6 * step)],
+        [origin + timedelta(milliseconds=(8 + 1 / 3) * step), origin + timedelta(milliseconds=9 * step)],
+    )
+
+    with get_engine().connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(text(f"CREATE TEMPORARY TABLE gapcheck_{interval}_candles (timestamp TIMESTAMP NOT NULL)"))
+            connection.execute(text(f"INSERT INTO gapcheck_{interval}_candles (timestamp) VALUES (:timestamp)"), bars)
+            found = scan_gaps('gapcheck', interval, connection=connection)
+        finally:
+            transaction.rollback()
+
+    if found == expected:
+        logger.info(f"Gap scan check passed on {interval} bars: {found}")
+    else:
+        logger.warning(f"Gap scan check failed on {interval} bars: expected {expected}, found {found}")
+    return found == expected
+
+def remove_duplicates(symbol, interval):
+    """Delete repeated timestamps, keeping the first inserted row, and return the number of rows removed."""
+    sql = text(f"""
+        DELETE FROM {symbol}_{interval}_candles a
+        USING {symbol}_{interval}_candles b
+        WHERE a.timestamp = b.timestamp AND a.id > b.id
+    """)
+    with get_engine().begin() as connection:
+        removed = connection.execute(sql).rowcount
+    logger.info(f"Removed {removed} duplicate candles from {symbol}_{interval}_candles")
+    return removed
+
+def repair_gaps(symbol, interval, dedupe=True, workers=backfill_workers, weight_per_minute=request_weight_limit):
+    """Re-fetch only the missing ranges of a candles table and return the number of candles written."""
+    gaps, duplicates, _ = scan_gaps(symbol, interval)
+    if dedupe and duplicates:
+        remove_duplicates(symbol, interval)
+    if not gaps:
+        return 0
+
+    budget = WeightBudget(weight_per_minute)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch_chunk, symbol, interval, start, end, budget) for start, end in gaps]
+        total = 0
+        for (start, end), future in zip(gaps, futures):
+            try:
+                total += future.result()
+            except Exception as e:
+                logger.error(f"Error repairing {symbol} {interval} gap {datetime.fromtimestamp(start / 1000)} - {datetime.fromtimestamp(end / 1000)}: {e}")
+
+    # The local cache only appends past its high-water mark, so it would never see the repaired bars
+    if total:
+        CandleCache(symbol, interval).clear()
+
+    logger.info(f"Repaired {len(gaps)} gaps in {symbol}_{interval}_candles with {total} candles")
+    return total
+
+if __name__ == "__main__":
+    if os.getenv('CHECK_GAP_SCAN') == 'True':
+        check_scan()
+    for job_symbol, job_interval in parse_jobs(backfill_jobs):
+        repair_gaps(job_symbol, job_interval)
@@ -0,0 +1,126 @@
+import os
+import logging
+import numpy as np
+import backtrader as bt
+from dotenv import load_dotenv
+from .CandleDB import interval_step
+from .Metrics import EPOCH_NUM, DAY_MS
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/BackTest.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Finer candles used to fill stop and limit orders inside each backtest bar, e.g. '1m'
+intrabar_interval = os.getenv('INTRABAR_INTERVAL')
+
+class IntrabarIndex:
+    """Offsets of the finer candles inside each bar, computed once with two binary searches over the bars.
+
+    bar(i) is then a plain range slice of the finer arrays, without a query or a search per bar.
+    """
+
+    def __init__(self, bar_timestamp, interval, arrays):
+        self.timestamp = np.asarray(bar_timestamp, dtype=np.int64)
+        self.arrays = arrays
+        self.starts = np.searchsorted(arrays.timestamp, self.timestamp, side='left')
+        self.ends = np.searchsorted(arrays.timestamp, self.timestamp + interval_step(interval), side='left')
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def position(self, timestamp):
+        """Return the bar opening at `timestamp` (ms), or None."""
+        i = int(np.searchsorted(self.timestamp, timestamp))
+        return i if i < len(self.timestamp) and self.timestamp[i] == timestamp else None
+
+    def bar(self, i):
+        """Return the finer OHLCV rows of bar `i`."""
+        return self.arrays.ohlcv[self.starts[i]:self.ends[i]]
+
+def first_touch(ohlcv, price, isbuy, exectype):
+    """Return the row of the first finer candle on which a stop or limit order at `price` can fill, or None.
+
+    Buy stops and sell limits need the price to trade at or above `price`, sell stops and buy limits at
+    or below it.
+    """
+    if len(ohlcv) == 0:
+        return None
+    above = isbuy == (exectype == bt.Order.Stop)
+    touched = ohlcv[:, 1] >= price if above else ohlcv[:, 2] <= price
+    row = int(touched.argmax())
+    return row if touched[row] else None
+
+class IntrabarBroker(bt.brokers.BackBroker):
+    """BackBroker that fills stop and limit orders on the finer candles of each bar.
+
+    Without finer data a bar whose range crosses both legs of an OCO pair (a stop loss and a profit target)
+    fills whichever order was submitted first. Here each leg fills on the first finer candle that reaches its
+    price, at that candle's open if it gapped through, and a leg reached later than its sibling waits for the
+    sibling to fill and cancel it. On the same finer candle the stop wins.
+    """
+
+    def __init__(self, indexes=None):
+        super().__init__()
+        self.indexes = indexes or {}  # {data feed: IntrabarIndex}
+
+    def _bar(self, order):
+        """Return the finer OHLCV rows of the bar `order` is tried on, or None without finer candles for it."""
+        index = self.indexes.get(order.data)
+        if index is None:
+            return None
+        bar = index.position(int(round((order.data.datetime[0] - EPOCH_NUM) * DAY_MS)))
+        if bar is None or index.starts[bar] == index.ends[bar]:
+            return None
+        return index.bar(bar)
+
+    def _touch(self, order, rows):
+        return first_touch(rows, order.created.price, order.isbuy(), order.exectype)
+
+    def _try_exec(self, order):
+        rows = self._bar(order) if order.exectype in (bt.Order.Stop, bt.Order.Limit) else None
+        if rows is None:
+            return super()._try_exec(order)
+        row = self._touch(order, rows)
+        if row is None:
+            return
+
+        # Leave the order for its OCO sibling if that one is reached first, the stop on the same candle
+        group = self._ocol.get(self._ocos.get(order.ref), [])
+        for sibling in self.pending:
+            if (sibling is None or sibling.ref not in group or sibling.data is not order.data
+                    or sibling.exectype not in (bt.Order.Stop, bt.Order.Limit)):
+                continue
+            sibling_row = self._touch(sibling, rows)
+            if sibling_row is None:
+                continue
+            if sibling_row < row or (sibling_row == row and sibling.exectype == bt.Order.Stop and order.exectype != bt.Order.Stop):
+                return
+
+        # Let backtrader fill it on the finer candle, which handles gaps through the price
+        data = order.data
+        saved = data.tick_open, data.tick_high, data.tick_low, data.tick_close
+        data.tick_open, data.tick_high, data.tick_low, data.tick_close = rows[row, :4].tolist()
+        try:
+            super()._try_exec(order)
+        finally:
+            data.tick_open, data.tick_high, data.tick_low, data.tick_close = saved
+
+def intrabar_index(bar_arrays, interval, finer_arrays):
+    """Build the IntrabarIndex of `bar_arrays` over the finer candles, warning about bars without any."""
+    index = IntrabarIndex(bar_arrays.timestamp, interval, finer_arrays)
+    missing = int(np.count_nonzero(index.starts == index.ends))
+    if missing:
+        logger.warning(f"{missing} of {len(index)} {interval} bars have no finer candles, their orders fill on the bar")
+    return index
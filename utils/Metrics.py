@@ -0,0 +1,336 @@
+import os
+import json
+import html
+import math
+import logging
+from collections import namedtuple
+import numpy as np
+import backtrader as bt
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/BackTest.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+Recording = namedtuple('Recording', ['timestamp', 'equity', 'position'])
+
+# backtrader's date number of 1970-01-01
+EPOCH_NUM = 719163.0
+DAY_MS = 86_400_000
+
+class EquityRecorder(bt.Analyzer):
+    """Record the timestamp, broker value and position size of every bar into preallocated arrays.
+
+    Preloaded feeds size the arrays once from their length, streamed feeds double them when full. The position
+    is the one the strategy holds on its own feed, which in a portfolio is not the first data.
+    """
+
+    def start(self):
+        self.feed = getattr(self.strategy, 'feed', self.data)
+        size = max(self.data.buflen(), 1024)
+        self.nums = np.empty(size)
+        self.values = np.empty(size)
+        self.sizes = np.empty(size)
+        self.count = 0
+
+    def next(self):
+        if self.count == len(self.values):
+            self.nums, self.values, self.sizes = (np.resize(array, 2 * len(array)) for array in (self.nums, self.values, self.sizes))
+        self.nums[self.count] = self.data.datetime[0]
+        self.values[self.count] = self.strategy.broker.getvalue()
+        self.sizes[self.count] = self.strategy.getposition(self.feed).size
+        self.count += 1
+
+    def get_analysis(self):
+        timestamp = np.rint((self.nums[:self.count] - EPOCH_NUM) * DAY_MS).astype(np.int64)
+        return Recording(timestamp, self.values[:self.count], self.sizes[:self.count])
+
+class RunningMetrics(bt.Analyzer):
+    """compute_metrics aggregated bar by bar, for streamed runs that must not keep the equity curve or the fills.
+
+    Only running sums, the drawdown state and the first bar spacings are kept, so memory stays constant
+    however long the run. The results match compute_metrics up to floating point summation order.
+    """
+    params = (
+        ('initial_cash', None),  # The broker's starting cash if not set
+        ('spacings', 1024),  # Bar spacings whose median gives the bars per year
+    )
+
+    def start(self):
+        self.feed = getattr(self.strategy, 'feed', self.data)
+        self.bars = 0
+        self.first = self.last = None
+        self.spacings = []
+        self.last_equity = None
+        self.equity_sum = 0.0
+        # Welford's running mean and sum of squared deviations of the bar returns
+        self.returns = 0
+        self.returns_mean = 0.0
+        self.returns_m2 = 0.0
+        self.downside_sq = 0.0
+        self.peak = None
+        self.peak_bar = 0
+        self.peak_time = 0
+        self.drawdown = 0.0
+        self.underwater = None  # Longest (bars, ms) from a peak to the next new high
+        self.exposed = 0
+        self.fills = 0
+        self.traded = 0.0
+        self.commission = 0.0
+        self.trades = {'total': 0, 'won': 0, 'lost': 0, 'won_sum': 0.0, 'lost_sum': 0.0, 'pnl_sum': 0.0, 'best': None, 'worst': None}
+
+    def next(self):
+        timestamp = int(round((self.data.datetime[0] - EPOCH_NUM) * DAY_MS))
+        equity = self.strategy.broker.getvalue()
+        if self.first is None:
+            self.first = timestamp
+        elif len(self.spacings) < self.p.spacings:
+            self.spacings.append(timestamp - self.last)
+        self.last = timestamp
+
+        if self.last_equity is not None:
+            change = equity / self.last_equity - 1
+            self.returns += 1
+            delta = change - self.returns_mean
+            self.returns_mean += delta / self.returns
+            self.returns_m2 += delta * (change - self.returns_mean)
+            self.downside_sq += min(change, 0.0) ** 2
+        self.last_equity = equity
+        self.equity_sum += equity
+
+        if self.peak is None or equity >= self.peak:
+            if self.peak is not None:
+                self.close_underwater(self.bars - self.peak_bar - 1, timestamp - self.peak_time)
+            self.peak, self.peak_bar, self.peak_time = equity, self.bars, timestamp
+        else:
+            self.drawdown = max(self.drawdown, (self.peak - equity) / self.peak)
+
+        if self.strategy.getposition(self.feed).size != 0:
+            self.exposed += 1
+        self.bars += 1
+
+    def close_underwater(self, bars, ms):
+        if self.underwater is None or bars > self.underwater[0]:
+            self.underwater = (bars, ms)
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills += 1
+            self.traded += abs(order.executed.size * order.executed.price)
+            self.commission += order.executed.comm
+
+    def notify_trade(self, trade):
+        if not trade.isclosed:
+            return
+        pnl = trade.pnlcomm
+        tally = self.trades
+        tally['total'] += 1
+        tally['pnl_sum'] += pnl
+        if pnl > 0:
+            tally['won'] += 1
+            tally['won_sum'] += pnl
+        elif pnl < 0:
+            tally['lost'] += 1
+            tally['lost_sum'] += pnl
+        tally['best'] = pnl if tally['best'] is None else max(tally['best'], pnl)
+        tally['worst'] = pnl if tally['worst'] is None else min(tally['worst'], pnl)
+
+    def get_analysis(self):
+        """The compute_metrics dict of the bars seen so far."""
+        initial_cash = self.p.initial_cash if self.p.initial_cash is not None else self.strategy.broker.startingcash
+        final_value = float(self.last_equity) if self.last_equity is not None else float(initial_cash)
+        step = float(np.median(self.spacings)) if self.spacings else 0
+        periods = 365 * DAY_MS / step if step > 0 else None
+        deviation = math.sqrt(self.returns_m2 / (self.returns - 1)) if self.returns > 1 else 0.0
+        downside = math.sqrt(self.downside_sq / self.returns) if self.returns else 0.0
+        years = (self.last - self.first) / (365 * DAY_MS) if self.bars > 1 else 0
+        underwater = self.underwater
+        if self.peak is not None:
+            # The stretch after the last high runs to the last bar
+            last_stretch = (self.bars - self.peak_bar - 1, self.last - self.peak_time)
+            if underwater is None or last_stretch[0] > underwater[0]:
+                underwater = last_stretch
+        duration_bars, duration_ms = underwater or (0, 0)
+        mean_equity = self.equity_sum / self.bars if self.bars else initial_cash
+        tally = self.trades
+
+        return {
+            'start': self.first,
+            'end': self.last,
+            'bars': self.bars,
+            'initial_cash': float(initial_cash),
+            'final_value': final_value,
+            'total_return': final_value / initial_cash - 1,
+            'annual_return': (final_value / initial_cash) ** (1 / years) - 1 if years > 0 and final_value > 0 else None,
+            'annual_volatility': deviation * math.sqrt(periods) if self.returns > 1 and periods else None,
+            'sharpe': self.returns_mean / deviation * math.sqrt(periods) if self.returns > 1 and periods and deviation > 0 else None,
+            'sortino': self.returns_mean / downside * math.sqrt(periods) if self.returns > 1 and periods and downside > 0 else None,
+            'max_drawdown': float(self.drawdown),
+            'max_drawdown_bars': duration_bars,
+            'max_drawdown_days': duration_ms / DAY_MS,
+            'exposure': self.exposed / self.bars if self.bars else 0.0,
+            'turnover': self.traded / mean_equity,
+            'fills': self.fills,
+            'commission': self.commission,
+            'trades': {
+                'total': tally['total'],
+                'won': tally['won'],
+                'lost': tally['lost'],
+                'win_rate': tally['won'] / tally['total'] if tally['total'] else None,
+                'avg_win': tally['won_sum'] / tally['won'] if tally['won'] else None,
+                'avg_loss': tally['lost_sum'] / tally['lost'] if tally['lost'] else None,
+                'best': tally['best'],
+                'worst': tally['worst'],
+                'profit_factor': tally['won_sum'] / -tally['lost_sum'] if tally['lost_sum'] < 0 else None,
+                'expectancy': tally['pnl_sum'] / tally['total'] if tally['total'] else None,
+            },
+        }
+
+def bars_per_year(timestamp):
+    """Bars in a year at the median spacing of `timestamp`, markets trading around the clock."""
+    if len(timestamp) < 2:
+        return None
+    step = np.median(np.diff(timestamp))
+    return 365 * DAY_MS / step if step > 0 else None
+
+def bar_returns(equity):
+    equity = np.asarray(equity, dtype=np.float64)
+    return equity[1:] / equity[:-1] - 1 if len(equity) > 1 else np.empty(0)
+
+def sharpe_ratio(returns, periods):
+    """Annualized Sharpe ratio of bar returns, None when undefined."""
+    if len(returns) < 2 or not periods:
+        return None
+    deviation = returns.std(ddof=1)
+    return float(returns.mean() / deviation * math.sqrt(periods)) if deviation > 0 else None
+
+def sortino_ratio(returns, periods):
+    """Annualized Sortino ratio of bar returns against a zero target, None when undefined."""
+    if len(returns) < 2 or not periods:
+        return None
+    downside = math.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    return float(returns.mean() / downside * math.sqrt(periods)) if downside > 0 else None
+
+def drawdown_stats(equity, timestamp):
+    """Return (max drawdown fraction, longest time under water in bars, the same in ms).
+
+    The time under water runs from a peak to the next new high, or to the last bar if none came.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0, 0, 0
+    peak = np.maximum.accumulate(equity)
+    drawdown = float(((peak - equity) / peak).max())
+    highs = np.flatnonzero(equity >= peak)
+    ends = np.append(highs[1:], len(equity))
+    lengths = ends - highs - 1
+    longest = int(lengths.argmax())
+    end = min(ends[longest], len(equity) - 1)
+    return drawdown, int(lengths[longest]), int(timestamp[end] - timestamp[highs[longest]])
+
+def trade_stats(pnl):
+    """Count, win rate, average, best and worst, profit factor and expectancy of the trades' net P&L."""
+    pnl = np.asarray(pnl, dtype=np.float64)
+    won, lost = pnl[pnl > 0], pnl[pnl < 0]
+    gross_loss = -lost.sum()
+    return {
+        'total': len(pnl),
+        'won': len(won),
+        'lost': len(lost),
+        'win_rate': len(won) / len(pnl) if len(pnl) else None,
+        'avg_win': float(won.mean()) if len(won) else None,
+        'avg_loss': float(lost.mean()) if len(lost) else None,
+        'best': float(pnl.max()) if len(pnl) else None,
+        'worst': float(pnl.min()) if len(pnl) else None,
+        'profit_factor': float(won.sum() / gross_loss) if gross_loss > 0 else None,
+        'expectancy': float(pnl.mean()) if len(pnl) else None,
+    }
+
+def compute_metrics(timestamp, equity, position, fills, trades, initial_cash):
+    """Compute every performance metric of a run in one vectorized pass.
+
+    `fills` is an (n, 4) array of (bar, size, price, commission) and `trades` the net P&L of each closed
+    trade. The result only holds plain numbers, so it can be cached and written as JSON.
+    """
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    equity = np.asarray(equity, dtype=np.float64)
+    fills = np.asarray(fills, dtype=np.float64).reshape(-1, 4)
+    final_value = float(equity[-1]) if len(equity) else float(initial_cash)
+
+    periods = bars_per_year(timestamp)
+    returns = bar_returns(equity)
+    drawdown, duration_bars, duration_ms = drawdown_stats(equity, timestamp)
+    years = (timestamp[-1] - timestamp[0]) / (365 * DAY_MS) if len(timestamp) > 1 else 0
+    total_return = final_value / initial_cash - 1
+    mean_equity = equity.mean() if len(equity) else initial_cash
+
+    return {
+        'start': int(timestamp[0]) if len(timestamp) else None,
+        'end': int(timestamp[-1]) if len(timestamp) else None,
+        'bars': len(equity),
+        'initial_cash': float(initial_cash),
+        'final_value': final_value,
+        'total_return': total_return,
+        'annual_return': (final_value / initial_cash) ** (1 / years) - 1 if years > 0 and final_value > 0 else None,
+        'annual_volatility': float(returns.std(ddof=1) * math.sqrt(periods)) if len(returns) > 1 and periods else None,
+        'sharpe': sharpe_ratio(returns, periods),
+        'sortino': sortino_ratio(returns, periods),
+        'max_drawdown': drawdown,
+        'max_drawdown_bars': duration_bars,
+        'max_drawdown_days': duration_ms / DAY_MS,
+        'exposure': float(np.count_nonzero(position) / len(position)) if len(position) else 0.0,
+        'turnover': float(np.abs(fills[:, 1] * fills[:, 2]).sum() / mean_equity),
+        'fills': len(fills),
+        'commission': float(fills[:, 3].sum()),
+        'trades': trade_stats(trades),
+    }
+
+def fast_metrics(timestamp, result, initial_cash):
+    """compute_metrics of a FastResult run over bars with the given timestamps."""
+    return compute_metrics(timestamp, result.equity, result.position, np.column_stack(result.fills),
+                           result.trades.pnlcomm, initial_cash)
+
+def flatten(metrics, prefix=''):
+    """Flatten nested metric dicts into 'trades.win_rate' style keys."""
+    rows = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            rows.update(flatten(value, f"{prefix}{key}."))
+        else:
+            rows[f"{prefix}{key}"] = value
+    return rows
+
+def equity_svg(equity, width=800, height=240, points=1000):
+    """Inline SVG polyline of an equity curve, thinned to at most `points` vertices."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return ''
+    equity = equity[np.linspace(0, len(equity) - 1, min(points, len(equity))).astype(np.int64)]
+    low, high = equity.min(), equity.max()
+    x = np.linspace(0, width, len(equity))
+    y = height - (equity - low) / ((high - low) or 1) * height
+    path = ' '.join(f"{a:.1f},{b:.1f}" for a, b in zip(x, y))
+    return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'<polyline fill="none" stroke="#1f77b4" stroke-width="1" points="{path}"/></svg>')
+
+def write_report(metrics, path, equity=None, title='Backtest Report'):
+    """Write the metrics to `path` as JSON, or as an HTML table with the equity curve when it ends in .html."""
+    if path.endswith('.html'):
+        rows = ''.join(f"<tr><th>{html.escape(key)}</th><td>{html.escape(str(value))}</td></tr>"
+                       for key, value in flatten(metrics).items())
+        content = (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head>"
+                   f"<body><h1>{html.escape(title)}</h1>{equity_svg(equity if equity is not None else [])}"
+                   f"<table>{rows}</table></body></html>")
+    else:
+        content = json.dumps(metrics, indent=2)
+    with open(path, 'w') as f:
+        f.write(content)
+    logger.info(f"Wrote metrics report to {path}")
@@ -0,0 +1,120 @@
+import os
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import text
+from .Clients import get_engine
+from .CandleDB import create_indexes
+from .GapScanner import remove_duplicates
+from .Backfill import parse_jobs, backfill_jobs
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Migration Setting
+partitioning = os.getenv('CANDLE_PARTITIONING') == 'monthly'
+months_ahead = int(os.getenv('PARTITION_MONTHS_AHEAD', 12))  # Empty partitions created past the current month
+
+def add_months(month, count):
+    """Return the first day of the month `count` months after `month`."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def is_partitioned(connection, table):
+    result = connection.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table
+        )
+    """), {'table': table.lower()})
+    return bool(result.fetchone()[0])
+
+def create_partitions(connection, table, first_month, last_month, parent=None):
+    """Create one range partition per month from first_month to last_month included."""
+    # Partitions are named after the final table even while attached to a staging parent
+    parent = parent or table
+    month = datetime(first_month.year, first_month.month, 1)
+    while month <= last_month:
+        next_month = add_months(month, 1)
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {table}_y{month.year}m{month.month:02d} PARTITION OF {parent}
+            FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')
+        """))
+        month = next_month
+
+def partition_table(symbol, interval, months_ahead=months_ahead):
+    """Rebuild a candles table as a monthly range-partitioned table and keep the original as {table}_old."""
+    table = f"{symbol}_{interval}_candles"
+    with get_engine().begin() as connection:
+        if is_partitioned(connection, table):
+            # Only roll the partitions forward
+            create_partitions(connection, table, datetime.now(), add_months(datetime.now(), months_ahead))
+            return
+
+        first, last = connection.execute(text(f"SELECT MIN(timestamp), MAX(timestamp) FROM {table}")).fetchone()
+        first = first or datetime.now()
+        last = max(last or first, datetime.now())
+
+        connection.execute(text(f"""
+            CREATE TABLE {table}_partitioned (
+                id BIGSERIAL NOT NULL,
+                symbol VARCHAR(20) NOT NULL,
+                interval VARCHAR(20) NOT NULL,
+                timestamp TIMESTAMP NOT NULL,
+                open_price NUMERIC(18, 8) NOT NULL,
+                high_price NUMERIC(18, 8) NOT NULL,
+                low_price NUMERIC(18, 8) NOT NULL,
+                close_price NUMERIC(18, 8) NOT NULL,
+                volume NUMERIC(18, 8) NOT NULL
+            ) PARTITION BY RANGE (timestamp)
+        """))
+        create_partitions(connection, table, first, add_months(last, months_ahead), parent=f"{table}_partitioned")
+        connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table}_partitioned DEFAULT"))
+
+        # Copied in time order so each partition is written once
+        connection.execute(text(f"""
+            INSERT INTO {table}_partitioned (id, symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume)
+            SELECT id, symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume
+            FROM {table} ORDER BY timestamp
+        """))
+        connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}_partitioned', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+
+        # Indexes take the names of the live table, so drop the old ones before swapping
+        connection.execute(text(f"DROP INDEX IF EXISTS {table}_key"))
+        connection.execute(text(f"DROP INDEX IF EXISTS {table}_timestamp_idx"))
+        connection.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+        connection.execute(text(f"ALTER TABLE {table}_partitioned RENAME TO {table}"))
+        create_indexes(connection, symbol, interval)
+
+    logger.info(f"Partitioned {table} by month, original rows kept in {table}_old")
+
+def migrate_table(symbol, interval, partition=partitioning):
+    """Deduplicate a candles table, add its unique key and time index, and optionally partition it by month."""
+    table = f"{symbol}_{interval}_candles"
+    remove_duplicates(symbol, interval)
+
+    if partition:
+        partition_table(symbol, interval)
+    else:
+        with get_engine().begin() as connection:
+            create_indexes(connection, symbol, interval)
+
+    with get_engine().begin() as connection:
+        connection.execute(text(f"ANALYZE {table}"))
+    logger.info(f"Migrated {table}")
+
+if __name__ == "__main__":
+    for job_symbol, job_interval in parse_jobs(backfill_jobs):
+        migrate_table(job_symbol, job_interval)
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/BackTest.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Monte Carlo Setting
+monte_carlo_paths = int(os.getenv('MONTE_CARLO_PATHS', 10_000))
+monte_carlo_method = os.getenv('MONTE_CARLO_METHOD', 'bootstrap')  # 'bootstrap' (with replacement) or 'shuffle'
+monte_carlo_confidence = float(os.getenv('MONTE_CARLO_CONFIDENCE', 0.95))
+monte_carlo_seed = os.getenv('MONTE_CARLO_SEED')
+monte_carlo_workers = int(os.getenv('MONTE_CARLO_WORKERS', os.cpu_count() or 1))
+
+# Paths per chunk, and a cap on paths x trades of one chunk that bounds its memory to about 64 MB of float64
+chunk_paths = 5_000
+chunk_cells = 8_000_000
+
+def trade_pnls(result):
+    """Return the net P&L of every closed trade of a FastResult or a summarize_results dict."""
+    if isinstance(result, dict):
+        return np.asarray(result['trades'], dtype=np.float64)
+    return np.asarray(result.trades.pnlcomm, dtype=np.float64)
+
+def simulate_paths(pnl, initial_cash, paths, method, seed):
+    """Return (total_return, max_drawdown, ruined) of `paths` resampled trade sequences, one row per path.
+
+    Each path replays the trades' P&L in a new order (shuffle) or draws as many trades with replacement
+    (bootstrap) on top of `initial_cash`. Drawdowns are fractions of the running peak and a path is ruined
+    once its equity reaches zero.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(pnl)
+    if method == 'bootstrap':
+        samples = pnl[rng.integers(0, count, size=(paths, count))]
+    elif method == 'shuffle':
+        samples = rng.permuted(np.broadcast_to(pnl, (paths, count)), axis=1)
+    else:
+        raise ValueError(f"Unknown Monte Carlo method: {method}")
+
+    equity = np.cumsum(samples, axis=1, out=samples)
+    equity += initial_cash
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(peak, initial_cash, out=peak)
+    drawdown = ((peak - equity) / peak).max(axis=1)
+    ruined = equity.min(axis=1) <= 0
+    return equity[:, -1] / initial_cash - 1, np.minimum(drawdown, 1.0), ruined
+
+def _simulate_chunk(task):
+    return simulate_paths(*task)
+
+def confidence_interval(values, confidence=monte_carlo_confidence):
+    """Return the (low, high) percentiles holding `confidence` of `values`."""
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(values, [tail, 100 - tail])
+    return float(low), float(high)
+
+def monte_carlo(pnl, initial_cash, paths=monte_carlo_paths, method=monte_carlo_method, confidence=monte_carlo_confidence,
+                workers=monte_carlo_workers, seed=monte_carlo_seed):
+    """Resample the trade list into `paths` equity paths and return confidence intervals of return and drawdown.
+
+    Paths are simulated in chunks spread over a process pool. Every chunk draws from its own child of one
+    SeedSequence, so a seed gives the same result whatever the number of workers.
+    """
+    pnl = np.ascontiguousarray(pnl, dtype=np.float64)
+    if len(pnl) == 0:
+        logger.warning("No closed trades to resample")
+        return None
+
+    started = time.perf_counter()
+    # Chunks don't depend on the worker count, so neither do the seeds each chunk draws from
+    chunk = max(1, min(chunk_paths, chunk_cells // len(pnl)))
+    sizes = [min(chunk, paths - offset) for offset in range(0, paths, chunk)]
+    seeds = np.random.SeedSequence(None if seed is None else int(seed)).spawn(len(sizes))
+    tasks = [(pnl, initial_cash, size, method, child) for size, child in zip(sizes, seeds)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            chunks = list(executor.map(_simulate_chunk, tasks))
+    else:
+        chunks = [_simulate_chunk(task) for task in tasks]
+    total_return, drawdown, ruined = (np.concatenate(values) for values in zip(*chunks))
+
+    report = {
+        'paths': paths,
+        'trades': len(pnl),
+        'method': method,
+        'confidence': confidence,
+        'return': {
+            'observed': float(pnl.sum() / initial_cash),
+            'median': float(np.median(total_return)),
+            'interval': confidence_interval(total_return, confidence),
+        },
+        'max_drawdown': {
+            'median': float(np.median(drawdown)),
+            'interval': confidence_interval(drawdown, confidence),
+            'worst': float(drawdown.max()),
+        },
+        'probability_of_loss': float((total_return < 0).mean()),
+        'probability_of_ruin': float(ruined.mean()),
+    }
+    logger.info(f"Monte Carlo: {paths} {method} paths of {len(pnl)} trades in {time.perf_counter() - started:.2f}s")
+    return report
+
+def log_monte_carlo(report):
+    """Log a monte_carlo report."""
+    if report is None:
+        return
+    level = f"{report['confidence']:.0%}"
+    low, high = report['return']['interval']
+    logger.info(f"Monte Carlo Return: median {report['return']['median']:.2%}, {level} interval [{low:.2%}, {high:.2%}]")
+    low, high = report['max_drawdown']['interval']
+    logger.info(f"Monte Carlo Max Drawdown: median {report['max_drawdown']['median']:.2%}, {level} interval [{low:.2%}, {high:.2%}], worst {report['max_drawdown']['worst']:.2%}")
+    logger.info(f"Monte Carlo Probability of Loss: {report['probability_of_loss']:.2%}, of Ruin: {report['probability_of_ruin']:.2%}")
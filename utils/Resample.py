@@ -0,0 +1,79 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from .CandleDB import interval_step
+from .CandleCache import CandleArrays, CandleCache
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/DataFeed.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Interval actually ingested; every higher timeframe is derived from it
+base_interval = os.getenv('BASE_INTERVAL', '1m')
+
+def bucket_offset(interval):
+    """Return the offset in ms of the bucket boundaries from the epoch; Binance weeks open on Monday."""
+    return 4 * 86_400_000 if interval.endswith('w') else 0
+
+def resample(arrays, interval, base_interval=base_interval, closed_only=True):
+    """Aggregate base candles into `interval` candles with vectorized reductions.
+
+    When closed_only is set, the last bucket is dropped unless its final base bar is present.
+    """
+    step = interval_step(interval)
+    base_step = interval_step(base_interval)
+    if step % base_step:
+        raise ValueError(f"{interval} is not a multiple of {base_interval}")
+    if len(arrays.timestamp) == 0:
+        return CandleArrays.empty()
+
+    offset = bucket_offset(interval)
+    bucket = (arrays.timestamp - offset) // step
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(bucket)])) - 1
+
+    ohlcv = np.empty((len(starts), 5), dtype=np.float64)
+    ohlcv[:, 0] = arrays.open[starts]
+    ohlcv[:, 1] = np.maximum.reduceat(arrays.high, starts)
+    ohlcv[:, 2] = np.minimum.reduceat(arrays.low, starts)
+    ohlcv[:, 3] = arrays.close[ends]
+    ohlcv[:, 4] = np.add.reduceat(arrays.volume, starts)
+    timestamp = bucket[starts] * step + offset
+
+    if closed_only and arrays.timestamp[-1] + base_step < timestamp[-1] + step:
+        return CandleArrays(timestamp[:-1], ohlcv[:-1])
+    return CandleArrays(timestamp, ohlcv)
+
+def resampled_cache(symbol, interval, base_interval=base_interval):
+    return CandleCache(symbol, f"{interval}_from_{base_interval}")
+
+def update_resampled(engine, symbol, interval, base_interval=base_interval):
+    """Bring the base and derived caches up to date and return the full derived history.
+
+    Only base bars from the first bucket after the derived high-water mark are aggregated again.
+    """
+    base = CandleCache(symbol, base_interval).update(engine)
+    derived = resampled_cache(symbol, interval, base_interval)
+
+    high_water_mark = derived.high_water_mark()
+    if high_water_mark is not None:
+        base = base.between(pd.Timestamp(high_water_mark + interval_step(interval), unit='ms'))
+
+    appended = derived.append(resample(base, interval, base_interval))
+    if appended:
+        logger.info(f"Appended {appended} {symbol} {interval} candles resampled from {base_interval}")
+    return derived.load()
@@ -0,0 +1,138 @@
+import os
+import json
+import glob
+import fcntl
+import pickle
+import hashlib
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure logging
+log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/BackTest.log')
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file_path),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Result Cache Setting
+result_cache_dir = os.getenv('RESULT_CACHE_DIR', os.path.join(root_dir, 'cache', 'results'))
+result_cache_max_bytes = int(float(os.getenv('RESULT_CACHE_MAX_MB', 256)) * 1024 * 1024)
+
+# Sources whose changes can change a backtest result
+code_files = ('Backtest.py', 'strats/*.py', 'utils/Risk.py', 'utils/Intrabar.py', 'utils/Metrics.py')
+
+_code_version = None
+
+def code_version():
+    """Hash of the strategy and backtest sources, computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for pattern in code_files:
+            for path in sorted(glob.glob(os.path.join(root_dir, pattern))):
+                with open(path, 'rb') as f:
+                    digest.update(os.path.relpath(path, root_dir).encode())
+                    digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+def result_key(table, arrays, params, **settings):
+    """Content address of a backtest: candle range and checksum, params, broker settings and code version."""
+    digest = hashlib.sha256()
+    summary = {
+        'table': table,
+        'rows': len(arrays.timestamp),
+        'first': int(arrays.timestamp[0]) if len(arrays.timestamp) else None,
+        'last': int(arrays.timestamp[-1]) if len(arrays.timestamp) else None,
+        'params': params,
+        'settings': settings,
+        'code': code_version(),
+    }
+    digest.update(json.dumps(summary, sort_keys=True, default=str).encode())
+    # The checksum catches repaired or rewritten bars inside an unchanged range
+    digest.update(np.ascontiguousarray(arrays.timestamp, dtype=np.int64))
+    digest.update(np.ascontiguousarray(arrays.ohlcv, dtype=np.float64))
+    return digest.hexdigest()
+
+class ResultCache:
+    """Backtest results pickled on disk under their content address, evicted least recently used first.
+
+    Reading an entry refreshes its modification time, which orders the eviction once the entries
+    take more than max_bytes.
+    """
+
+    def __init__(self, root=result_cache_dir, max_bytes=result_cache_max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(root, '.lock')
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the stored result for `key`, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cached result {key}: {e}")
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """Store `result` under `key` and evict old entries beyond the size limit."""
+        path = self.path(key)
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(f"{path}.tmp", 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.root, '*.pkl')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+            logger.debug(f"Evicted cached result {os.path.basename(path)}")
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.root, '*.pkl')):
+            self.remove(path)
@@ -1,32 +1,44 @@
 import os
 import time
 import logging
-from binance.client import Client
 from dotenv import load_dotenv
-from binance.enums import *
-from binance.exceptions import BinanceAPIException
 from .DataBase import insert_trade
 from .SafeAPI import safe_api_call
+from .Clients import get_client
+from .AccountStream import get_mirror
 
 # Load environment variables
 load_dotenv()
 
-api_key = os.getenv('BINANCE_API_KEY')
-api_secret = os.getenv('BINANCE_API_SECRET')
-api_testnet_key = os.getenv('BINANCE_TESTNET_KEY')
-api_testnet_secret = os.getenv('BINANCE_TESTNET_SECRET')
-use_testnet = os.getenv('USE_TESTNET') == 'True'
 symbol = os.getenv('SYMBOL')
 
-# Initialize Binance client
-if use_testnet:
-    client = Client(api_testnet_key, api_testnet_secret, testnet=True)
-else:
-    client = Client(api_key, api_secret)
-
 RISK_PERCENTAGE = float(os.getenv('RISK_PERCENTAGE', 0.01)) # e.g., 0.01 for 1% risk per trade
 ACCOUNT_SIZE = float(os.getenv('ACCOUNT_SIZE', 1000)) # Account size in USDT
 
+# Share of ACCOUNT_SIZE that may be at risk across all open positions of a portfolio
+PORTFOLIO_RISK = float(os.getenv('PORTFOLIO_RISK', 0.05))
+
+class RiskBudget:
+    """Portfolio-wide cap on the amount at risk, shared by the strategies of every symbol."""
+
+    def __init__(self, account_size=ACCOUNT_SIZE, max_risk=PORTFOLIO_RISK):
+        self.limit = account_size * max_risk
+        self.open_risk = {}
+
+    def available(self):
+        return self.limit - sum(self.open_risk.values())
+
+    def reserve(self, symbol, amount):
+        """Reserve up to `amount` of risk for a position in `symbol` and return the amount granted."""
+        granted = max(min(amount, self.available()), 0.0)
+        if granted > 0:
+            self.open_risk[symbol] = self.open_risk.get(symbol, 0.0) + granted
+        return granted
+
+    def release(self, symbol):
+        """Free the risk held by a closed position in `symbol`."""
+        self.open_risk.pop(symbol, None)
+
 def position_size(potential_loss, risk_percentage, account_size):
     if potential_loss <= 0:
         raise ValueError("Potential loss must be greater than zero.")
@@ -43,6 +55,7 @@ def adjust_stop_loss(trade, current_price, stop_loss, trailing_stop=False):
 
 @safe_api_call
 def manage_trade(trade, broker):
+    from binance.exceptions import BinanceAPIException
     if trade.isopen:
         current_price = trade.data.close[-1]
         trade.params.stop_loss = adjust_stop_loss(trade, current_price, trade.params.stop_loss, trailing_stop=True)
@@ -50,7 +63,7 @@ def manage_trade(trade, broker):
         if current_price <= trade.params.stop_loss:
             logging.info(f"Selling {trade.size} {trade.data._name} @ {current_price} for a loss")
             try:
-                order = client.order_market_sell(
+                order = get_client().order_market_sell(
                     symbol=symbol,
                     quantity=trade.size
                 )
@@ -62,7 +75,7 @@ def manage_trade(trade, broker):
         elif current_price >= trade.params.take_profit:
             logging.info(f"Selling {trade.size} {trade.data._name} @ {current_price} for a profit")
             try:
-                order = client.order_market_sell(
+                order = get_client().order_market_sell(
                     symbol=symbol,
                     quantity=trade.size
                 )
@@ -75,7 +88,11 @@ def manage_trade(trade, broker):
 @safe_api_call
 def get_margin_percentage(symbol):
     """Returns the margin percentage on isolated trades for the given symbol."""
-    account = client.futures_account()
+    # The account mirror answers from memory, REST is only asked while it isn't in sync
+    mirror = get_mirror()
+    if mirror is not None and mirror.synced and 'isolatedMarginPercent' in mirror.asset(symbol):
+        return float(mirror.asset(symbol)['isolatedMarginPercent'])
+    account = get_client().futures_account()
     for balance in account['userAssets']:
         if balance['asset'] == symbol:
             return float(balance['isolatedMarginPercent'])
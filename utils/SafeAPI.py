@@ -2,7 +2,6 @@
 import logging
 import time
 import os
-from binance.exceptions import BinanceAPIException, BinanceRequestException
 
 # Configure logging
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/SafeAPI.log')
@@ -26,6 +25,8 @@ def safe_api_call(api_call_func):
     Decorator function for safely making API calls with retries and rate limiting.
     """
     def wrapper(*args, **kwargs):
+        # Imported on first call, loading the binance package costs most of the import time of a backtest
+        from binance.exceptions import BinanceAPIException, BinanceRequestException
         retry_count = 0
         while retry_count < MAX_RETRIES:
             try: